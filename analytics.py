@@ -0,0 +1,168 @@
+# analytics.py
+# Fund performance over fund_history: time-weighted return, money-weighted
+# return (XIRR), max drawdown and rolling volatility.
+#
+# All funds are laid out as one padded matrix (fund x entry) so every metric
+# is computed for the whole portfolio with NumPy instead of per-fund loops.
+# Each entry's fixed_amount counts as a contribution paid in on that date,
+# and actual_value is the value after that contribution.
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+
+DAYS_PER_YEAR = 365.25
+VOLATILITY_WINDOW = 12  # entries, i.e. one year of monthly updates
+
+METRIC_COLUMNS = ["entries", "twr", "twr_annual", "xirr", "max_drawdown", "volatility"]
+
+_metrics_cache = {}  # fund name -> (signature, metrics row)
+_metrics_lock = threading.Lock()
+
+
+def fund_matrix(histories):
+    # Pads every fund's history to the longest one; missing cells are NaN
+    histories = histories.assign(last_updated=pd.to_datetime(histories["last_updated"]))
+    histories = histories.sort_values(["name", "last_updated"], kind="stable")
+    codes, names = pd.factorize(histories["name"], sort=True)
+    positions = histories.groupby(codes).cumcount().to_numpy()
+    counts = np.bincount(codes, minlength=len(names))
+
+    shape = (len(names), counts.max() if len(counts) else 0)
+    values = np.full(shape, np.nan)
+    contributions = np.full(shape, np.nan)
+    days = np.full(shape, np.nan)
+    values[codes, positions] = histories["actual_value"].to_numpy(dtype=float)
+    contributions[codes, positions] = histories["fixed_amount"].fillna(0).to_numpy(dtype=float)
+    days[codes, positions] = histories["last_updated"].to_numpy().astype("datetime64[D]").astype(float)
+    return list(names), values, contributions, days, counts
+
+
+def period_returns(values, contributions):
+    # Return of each period with the contribution paid in at its end taken out
+    previous = values[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = (values[:, 1:] - contributions[:, 1:]) / previous - 1
+    returns[~(previous > 0)] = np.nan
+    return returns
+
+
+def time_weighted_return(returns, days):
+    growth = np.where(np.isnan(returns), 1.0, 1.0 + returns)
+    twr = growth.prod(axis=1) - 1
+    twr[np.isnan(returns).all(axis=1)] = np.nan
+
+    span = (np.nanmax(days, axis=1) - np.nanmin(days, axis=1)) / DAYS_PER_YEAR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annual = np.where(span > 0, (1 + twr) ** (1 / span) - 1, np.nan)
+    return twr, annual
+
+
+def xirr(values, contributions, days, counts, iterations=50, tolerance=1e-8):
+    # Newton's method on the NPV of all funds at once. Cash flows: the first
+    # value is paid in, then every contribution, and the last value is paid out.
+    rows = np.arange(len(counts))
+    last = np.maximum(counts - 1, 0)
+    flows = -np.nan_to_num(contributions)
+    flows[:, 0] = -np.nan_to_num(values[:, 0])
+    flows[rows, last] += np.nan_to_num(values[rows, last])
+    years = np.nan_to_num((days - days[:, :1]) / DAYS_PER_YEAR)
+
+    rate = np.full(len(counts), 0.05)
+    converged = np.zeros(len(counts), dtype=bool)
+    for _ in range(iterations):
+        base = 1 + rate[:, None]
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            discounted = flows * base ** -years
+            npv = discounted.sum(axis=1)
+            slope = (-years * discounted / base).sum(axis=1)
+            step = np.where(slope != 0, npv / slope, 0.0)
+        step = np.nan_to_num(step)
+        rate = np.maximum(rate - step, -0.9999)
+        converged = np.abs(step) < tolerance
+        if converged.all():
+            break
+
+    rate[~converged | (counts < 2)] = np.nan
+    return rate
+
+
+def max_drawdown(returns):
+    # Deepest fall of the time-weighted index below its previous peak
+    growth = np.where(np.isnan(returns), 1.0, 1.0 + returns)
+    index = np.cumprod(np.hstack([np.ones((len(returns), 1)), growth]), axis=1)
+    drawdown = (index / np.maximum.accumulate(index, axis=1) - 1).min(axis=1)
+    drawdown[np.isnan(returns).all(axis=1)] = np.nan
+    return drawdown
+
+
+def periods_per_year(days):
+    # From the median spacing of the entries; funds with one entry give NaN
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return DAYS_PER_YEAR / np.nanmedian(np.diff(days, axis=1), axis=1)
+
+
+def rolling_volatility(returns, days, window=VOLATILITY_WINDOW):
+    # Annualized standard deviation of the period returns over a sliding window;
+    # column i is the window ending with return i + window - 1
+    if returns.shape[1] < window:
+        return np.full((len(returns), 0), np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(returns, window, axis=1)
+    full = ~np.isnan(windows).any(axis=2)
+    std = np.full(windows.shape[:2], np.nan)
+    std[full] = windows[full].std(axis=1, ddof=1)
+    return std * np.sqrt(periods_per_year(days))[:, None]
+
+
+def fund_metrics(histories, window=VOLATILITY_WINDOW):
+    if histories.empty:
+        return pd.DataFrame(columns=METRIC_COLUMNS, index=pd.Index([], name="name"))
+
+    names, values, contributions, days, counts = fund_matrix(histories)
+    returns = period_returns(values, contributions)
+    twr, twr_annual = time_weighted_return(returns, days)
+
+    # Latest complete window per fund: it ends with the fund's last return
+    volatility = np.full(len(names), np.nan)
+    rolling = rolling_volatility(returns, days, window)
+    last_window = counts - 1 - window
+    has_window = (last_window >= 0) & (last_window < rolling.shape[1])
+    volatility[has_window] = rolling[has_window, last_window[has_window]]
+
+    return pd.DataFrame({
+        "entries": counts,
+        "twr": twr,
+        "twr_annual": twr_annual,
+        "xirr": xirr(values, contributions, days, counts),
+        "max_drawdown": max_drawdown(returns),
+        "volatility": volatility,
+    }, index=pd.Index(names, name="name"))
+
+
+def _signatures(histories):
+    # Changes whenever a fund gets a new, edited or deleted entry
+    hashes = pd.util.hash_pandas_object(histories[["fixed_amount", "actual_value", "last_updated"]], index=False)
+    grouped = hashes.groupby(histories["name"].to_numpy()).agg(["sum", "size"])
+    return dict(zip(grouped.index, zip(grouped["sum"], grouped["size"])))
+
+
+def cached_fund_metrics(histories):
+    # Only funds whose entries changed since the last call are recomputed
+    if histories.empty:
+        return fund_metrics(histories)
+
+    signatures = _signatures(histories)
+    with _metrics_lock:
+        stale = [name for name, sig in signatures.items() if _metrics_cache.get(name, (None,))[0] != sig]
+    if stale:
+        fresh = fund_metrics(histories[histories["name"].isin(stale)])
+        with _metrics_lock:
+            for name, row in zip(fresh.index, fresh.to_numpy(dtype=float)):
+                _metrics_cache[name] = (signatures[name], row)
+
+    names = list(signatures)
+    with _metrics_lock:
+        rows = np.vstack([_metrics_cache[name][1] for name in names])
+    metrics = pd.DataFrame(rows, columns=METRIC_COLUMNS, index=pd.Index(names, name="name"))
+    return metrics.astype({"entries": "int64"})
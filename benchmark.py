@@ -0,0 +1,216 @@
+# benchmark.py
+# Headless benchmarks for the database layer and chart builders on synthetic
+# data. Databases are generated once per size and reused from --data-dir.
+#
+#   python benchmark.py                              # 10k/100k/1M expenses, 10/100/1000 funds
+#   python benchmark.py --expenses 10000 --funds 10  # quick run
+#   python benchmark.py --json results.json          # save results
+#   python benchmark.py --baseline results.json      # fail on regressions
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import pandas as pd
+import streamlit.logger
+
+import analytics
+import db
+import finance
+import projection
+from pages import charts, dashboard
+
+EXPENSE_SCALES = [10_000, 100_000, 1_000_000]
+FUND_SCALES = [10, 100, 1000]
+FUND_MONTHS = 120
+PROJECTION_FUNDS = 20
+
+
+class QueryCounter:
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = 0
+
+    def __enter__(self):
+        self.conn.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_trace_callback(None)
+
+    def _trace(self, statement):
+        # Only count real statements, not transaction control
+        if not statement.lstrip().upper().startswith(("BEGIN", "COMMIT", "PRAGMA")):
+            self.count += 1
+
+
+def _rows(result):
+    if isinstance(result, tuple):
+        return sum(_rows(item) for item in result)
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return 0
+
+
+def measure(conn, func, repeat, cold=True):
+    # Latency is the median over repeats; memory and queries come from one
+    # extra traced run. cold=True clears the read cache before every call.
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            db.clear_read_cache()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if cold:
+        db.clear_read_cache()
+    tracemalloc.start()
+    with QueryCounter(conn) as queries:
+        result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "peak_mb": peak / 1e6,
+        "queries": queries.count,
+        "rows": _rows(result),
+    }
+
+
+def expense_db(data_dir, count):
+    path = os.path.join(data_dir, f"bench_expenses_{count}.db")
+    if not os.path.exists(path):
+        conn = db.connect(path)
+        db.init_db(conn)
+        db.populate_dummy_expenses(conn, count, years=5, seed=count)
+        for offset in range(5):
+            valid_from = date(date.today().year - 4 + offset, 1, 1)
+            db.upsert_fixed_cost(conn, "Miete", 800 + 20 * offset, valid_from)
+            db.upsert_fixed_income(conn, "Gehalt", 2500 + 50 * offset, valid_from)
+        conn.close()
+    return path
+
+
+def fund_db(data_dir, count):
+    path = os.path.join(data_dir, f"bench_funds_{count}.db")
+    if not os.path.exists(path):
+        conn = db.connect(path)
+        db.init_db(conn)
+        names = [f"Fonds {i:04d}" for i in range(count)]
+        db.populate_dummy_fund_data(conn, names=names, months_back=FUND_MONTHS, seed=count)
+        conn.close()
+    return path
+
+
+def expense_cases(conn):
+    today = date.today()
+    month_start = today.replace(day=1)
+    rollup = db.get_monthly_rollup(conn)
+    decade = finance.month_range(today.replace(year=today.year - 10), today)
+    rollup_year = db.get_monthly_rollup(conn, today.year)
+    month = db.get_expenses_typed(conn, month_start, today)
+    return {
+        "get_expenses": lambda: db.get_expenses(conn),
+        "get_expenses_between (month)": lambda: db.get_expenses_between(conn, month_start, today),
+        "get_expenses_typed (month)": lambda: db.get_expenses_typed(conn, month_start, today),
+        "get_expense_page (first)": lambda: db.get_expense_page(conn),
+        "get_expense_page (4 years back)": lambda: db.get_expense_page(
+            conn, (today.replace(year=today.year - 4), 0)
+        ),
+        "get_monthly_rollup (year)": lambda: db.get_monthly_rollup(conn, today.year),
+        "prepare_chart_frame (month)": lambda: finance.prepare_chart_frame(month),
+        "financial_summary_export": lambda: charts.financial_summary_export(conn),
+        "monthly_balances (10 years)": lambda: finance.monthly_balances(
+            decade, finance.rollup_month_totals(rollup),
+            db.get_fixed_cost_history(conn), db.get_fixed_income_history(conn),
+        ),
+        "get_fixed_cost_postings (30 years)": lambda: db.get_fixed_cost_postings(
+            conn, today, today.replace(year=today.year + 30)
+        ),
+        "bar_chart_grouped_by_month_category": lambda: charts.bar_chart_grouped_by_month_category(rollup_year),
+    }
+
+
+def fund_cases(conn):
+    name = db.get_all_fund_names(conn)[0]
+    history = db.get_fund_history(conn, name)
+    funds = projection.fund_parameters(db.get_all_fund_histories(conn)).head(PROJECTION_FUNDS)
+    return {
+        "get_fund_history": lambda: db.get_fund_history(conn, name),
+        "get_all_fund_histories": lambda: db.get_all_fund_histories(conn),
+        "get_latest_fund_snapshot": lambda: db.get_latest_fund_snapshot(conn),
+        "fund_returns": lambda: finance.fund_returns(history),
+        "fund_metrics (all funds)": lambda: analytics.fund_metrics(db.get_all_fund_histories(conn)),
+        "plot_all_funds": lambda: dashboard.plot_all_funds(db.get_all_fund_histories(conn)),
+        "project (1k paths x 360 months)": lambda: projection.project(funds, months=360, paths=1000, seed=0),
+        "project (10k paths x 360 months)": lambda: projection.project(funds, months=360, paths=10_000, seed=0),
+    }
+
+
+def run(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = []
+    suites = [(expense_db, expense_cases, "expenses", scale) for scale in args.expenses]
+    suites += [(fund_db, fund_cases, "funds", scale) for scale in args.funds]
+    for make_db, cases, kind, scale in suites:
+        print(f"Preparing {kind}={scale} ...", file=sys.stderr)
+        conn = db.connect(make_db(args.data_dir, scale))
+        db.init_db(conn)  # databases from older runs may need new columns
+        for name, func in cases(conn).items():
+            stats = measure(conn, func, args.repeat, cold=not args.warm)
+            results.append({"function": name, "scale": f"{kind}={scale}", **stats})
+            print(f"  {name:<40} {stats['median_ms']:>10.1f} ms", file=sys.stderr)
+        conn.close()
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as f:
+        baseline = {(r["function"], r["scale"]): r for r in json.load(f)}
+
+    regressions = []
+    for result in results:
+        before = baseline.get((result["function"], result["scale"]))
+        if before and result["median_ms"] > before["median_ms"] * threshold:
+            regressions.append((result, before))
+    for result, before in regressions:
+        print(f"REGRESSION {result['function']} [{result['scale']}]: "
+              f"{before['median_ms']:.1f} ms -> {result['median_ms']:.1f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks für db.py und die Diagramme")
+    parser.add_argument("--expenses", type=int, nargs="*", default=EXPENSE_SCALES)
+    parser.add_argument("--funds", type=int, nargs="*", default=FUND_SCALES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warm", action="store_true", help="Read-Cache zwischen den Wiederholungen behalten")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "finanzen_bench"))
+    parser.add_argument("--json", help="Ergebnisse als JSON speichern")
+    parser.add_argument("--baseline", help="JSON einer früheren Messung zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Erlaubter Faktor gegenüber der Baseline")
+    args = parser.parse_args(argv)
+
+    # Chart builders call st.* outside of a running app
+    streamlit.logger.set_log_level("error")
+    results = run(args)
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
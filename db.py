@@ -1,14 +1,269 @@
+import os
+import re
 import sqlite3
+import threading
+from collections import OrderedDict
+from functools import wraps
+import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import date
+from finance import iter_postings, month_range
 
 DB_NAME = "expenses.db"
 
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_SIZE_KB = 64 * 1024
+
+class Connection(sqlite3.Connection):
+    # Identifies the database file for the read cache and remembers the last
+    # seen PRAGMA data_version to detect writes from other processes
+    db_key = None
+    data_version = None
+
+def connect(db_name=DB_NAME):
+    conn = sqlite3.connect(db_name, check_same_thread=False, timeout=10, factory=Connection)
+    conn.db_key = id(conn) if db_name == ":memory:" else os.path.abspath(db_name)
+    # WAL lets readers of other sessions proceed while one session writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={-CACHE_SIZE_KB}")
+    return conn
+
+class ConnectionManager:
+    # Hands out one connection per thread. Streamlit runs every script run in
+    # its own thread, so connections of finished threads are reclaimed into a
+    # small idle pool instead of opening a new one per rerun.
+
+    def __init__(self, db_name=DB_NAME, max_idle=4):
+        self.db_name = db_name
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._by_thread = {}
+        self._idle = []
+        self._schema_ready = False
+
+    def connection(self):
+        ident = threading.get_ident()
+        with self._lock:
+            conn = self._by_thread.get(ident)
+            if conn is not None:
+                return conn
+            self._reclaim()
+            conn = self._idle.pop() if self._idle else connect(self.db_name)
+            if not self._schema_ready:
+                init_db(conn)
+                self._schema_ready = True
+            self._by_thread[ident] = conn
+            return conn
+
+    def _reclaim(self):
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in self._by_thread if ident not in alive]:
+            conn = self._by_thread.pop(ident)
+            conn.rollback()
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            for conn in [*self._by_thread.values(), *self._idle]:
+                conn.close()
+            self._by_thread.clear()
+            self._idle.clear()
+
+@st.cache_resource
+def get_connection_manager(db_name=DB_NAME):
+    return ConnectionManager(db_name)
+
 def get_connection():
-    return sqlite3.connect(DB_NAME, check_same_thread=False)
+    return get_connection_manager().connection()
 
-def init_db(conn):
+# --- Read cache ---
+# Readers are memoized per database, arguments and the generation of every
+# table they read. Writers bump the generation of the tables they change, so
+# cached results are served until the data actually changes. Entries that
+# read a bumped table can never be hit again and are dropped right away.
+
+READ_CACHE_SIZE = 128
+
+_read_cache = OrderedDict()
+_generations = {}
+_cache_lock = threading.Lock()
+
+def _db_key(conn):
+    return getattr(conn, "db_key", None) or id(conn)
+
+def _bump(conn, *tables):
+    key = _db_key(conn)
+    with _cache_lock:
+        for table in tables:
+            _generations[(key, table)] = _generations.get((key, table), 0) + 1
+        stale = [
+            entry for entry, (read, _) in _read_cache.items()
+            if entry[1] == key and ("*" in tables or not read.isdisjoint(tables))
+        ]
+        for entry in stale:
+            del _read_cache[entry]
+
+def _current_generations(db_key, tables):
+    # Callers hold _cache_lock
+    return tuple(_generations.get((db_key, table), 0) for table in (*tables, "*"))
+
+def _sync_external_writes(conn):
+    # data_version changes when another connection (or process, e.g. the
+    # statement importer) committed. Since those writes may not have bumped
+    # anything in this process, every table of the database is invalidated.
+    if not isinstance(conn, Connection):
+        return
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if conn.data_version is not None and version != conn.data_version:
+        _bump(conn, "*")
+    conn.data_version = version
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _copy(result):
+    if isinstance(result, (pd.DataFrame, list, dict)):
+        return result.copy()
+    return result
+
+def data_version(conn, *tables):
+    # Changes whenever one of the tables is written, by this process or another
+    _sync_external_writes(conn)
+    with _cache_lock:
+        return _current_generations(_db_key(conn), tables)
+
+def cached_reader(*tables):
+    read = frozenset(tables)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            db_key = _db_key(conn)
+            generations = data_version(conn, *tables)
+            key = (func.__name__, db_key, _freeze(args), _freeze(sorted(kwargs.items())), generations)
+
+            with _cache_lock:
+                if key in _read_cache:
+                    _read_cache.move_to_end(key)
+                    return _copy(_read_cache[key][1])
+
+            result = func(conn, *args, **kwargs)
+            with _cache_lock:
+                # Not stored if a write came in meanwhile: it would be stale already
+                if _current_generations(db_key, tables) == generations:
+                    _read_cache[key] = (read, result)
+                    while len(_read_cache) > READ_CACHE_SIZE:
+                        _read_cache.popitem(last=False)
+            return _copy(result)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def clear_read_cache():
+    with _cache_lock:
+        _read_cache.clear()
+
+# --- Schema migrations ---
+# PRAGMA user_version holds the number of applied steps. Pending steps run in
+# order at startup. Every step must be safe to re-run: batched steps commit as
+# they go, so a step that was interrupted is simply repeated.
+MIGRATION_BATCH_SIZE = 50_000
+
+# Dates are stored as epoch days (days since 1970-01-01): range scans compare
+# integers, and loaders turn them into datetime64 columns without parsing text
+EPOCH_DAY = "CAST(julianday({value}) - 2440587.5 AS INTEGER)"
+NS_PER_DAY = 86_400 * 10 ** 9
+
+EXPENSES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date INTEGER,  -- epoch day
+        description TEXT,
+        category TEXT,
+        amount REAL,
+        last_updated TEXT,
+        import_hash INTEGER
+    )
+'''
+
+IMPORT_HASH_INDEX = '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_import_hash
+    ON expenses(import_hash) WHERE import_hash IS NOT NULL
+'''
+
+# Ordered by (date, id) through the implicit rowid, so a page of the
+# expense list is read straight from the index without sorting
+EXPENSE_PAGE_INDEX = "CREATE INDEX IF NOT EXISTS idx_expenses_date_id ON expenses(date)"
+
+# Covering indexes: sums over a date range (optionally per category) are
+# answered from the index without touching the table
+EXPENSE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_expenses_date_category_amount ON expenses(date, category, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_category_date_amount ON expenses(category, date, amount)",
+    IMPORT_HASH_INDEX,
+    EXPENSE_PAGE_INDEX,
+]
+
+# Indexes of the ISO text date schema (up to version 6)
+ISO_DATE_EXPENSE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses(category, date)",
+    IMPORT_HASH_INDEX,
+]
+
+def _columns(cursor, table):
+    return {row[1]: row[2] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+def _in_batches(conn, table, statements, batch_size=MIGRATION_BATCH_SIZE, first=None, last=None):
+    # Runs each statement with (first, last) rowid bounds per batch. Every batch
+    # is its own short transaction, so the app is never locked out for long.
+    low, high = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+    first = low if first is None else first
+    last = high if last is None else last
+    if first is None or last is None:
+        return
+    for start in range(first, last + 1, batch_size):
+        with conn:
+            for statement in statements:
+                conn.execute(statement, (start, min(start + batch_size - 1, last)))
+
+def _rebuild_table(conn, table, schema, copy, finish):
+    # Copies the table into a new one in batches, then swaps both in one short
+    # transaction that also copies rows written in the meantime. `copy` holds
+    # INSERT ... SELECT statements bounded by rowid, `finish` recreates indexes
+    # and triggers on the swapped table.
+    new = f"{table}_new"
+    conn.commit()
+    conn.execute(f"DROP TABLE IF EXISTS {new}")
+    conn.execute(schema.format(table=new))
+    copy = [statement.format(new=new) for statement in copy]
+    upto = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    _in_batches(conn, table, copy, last=upto)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for statement in copy:
+            conn.execute(statement, (upto + 1, 2 ** 63 - 1))
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new} RENAME TO {table}")
+        finish(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _migration_base_tables(conn):
+    # Schema as originally shipped
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS expenses (
@@ -49,157 +304,1116 @@ def init_db(conn):
         )
     ''')
     conn.commit()
-    
+
+def _migration_expense_indexes(conn):
+    cursor = conn.cursor()
+    cursor.execute(ISO_DATE_EXPENSE_INDEXES[0])
+    cursor.execute(ISO_DATE_EXPENSE_INDEXES[1])
+    conn.commit()
+
+def _migration_import_hash(conn):
+    # Dedup key of imported bank statement rows
+    cursor = conn.cursor()
+    if "import_hash" not in _columns(cursor, "expenses"):
+        cursor.execute("ALTER TABLE expenses ADD COLUMN import_hash INTEGER")
+    cursor.execute(IMPORT_HASH_INDEX)
+    conn.commit()
+
+def _migration_monthly_rollup(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS expense_monthly_rollup (
+            year INTEGER,
+            month INTEGER,
+            category TEXT,
+            total REAL,
+            count INTEGER,
+            PRIMARY KEY (year, month, category)
+        )
+    ''')
+    conn.commit()
+    rebuild_expense_rollup(conn)
+
+def _migration_funds(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS funds (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            fixed_amount REAL,  -- current monthly contribution
+            last_updated TEXT
+        )
+    ''')
+    conn.commit()
+    # Entries keyed by fund name move to a fund_history that references funds(id)
+    if "fund_id" not in _columns(conn.cursor(), "fund_history"):
+        _rebuild_table(conn, "fund_history", '''
+            CREATE TABLE IF NOT EXISTS {table} (
+                fund_id INTEGER NOT NULL REFERENCES funds(id) ON DELETE CASCADE,
+                fixed_amount REAL,
+                actual_value REAL,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                cumulative_contribution REAL
+            )
+        ''', [
+            '''
+            INSERT OR IGNORE INTO funds (name)
+            SELECT name FROM fund_history
+            WHERE rowid BETWEEN ? AND ? AND name IS NOT NULL
+            GROUP BY name ORDER BY MIN(rowid)
+            ''',
+            '''
+            INSERT INTO {new} (fund_id, fixed_amount, actual_value, last_updated)
+            SELECT f.id, h.fixed_amount, h.actual_value, h.last_updated
+            FROM fund_history h JOIN funds f ON f.name = h.name
+            WHERE h.rowid BETWEEN ? AND ?
+            ORDER BY h.rowid
+            ''',
+        ], finish=lambda cursor: None)
+    conn.execute(FUND_HISTORY_INDEX)
+    _sync_latest_fixed_amount(conn.cursor())
+    conn.commit()
+    rebuild_fund_contributions(conn)
+
+def _migration_expenses_last_updated_text(conn):
+    # expenses.last_updated was declared REAL while every other table stores
+    # ISO text; SQLite cannot change a column type, so the table is rebuilt
+    if _columns(conn.cursor(), "expenses").get("last_updated") == "TEXT":
+        return
+    columns = ", ".join(EXPENSE_COLUMNS + ["import_hash"])
+
+    def finish(cursor):
+        for statement in ISO_DATE_EXPENSE_INDEXES:
+            cursor.execute(statement)
+        # The rollup already counts these rows, only the triggers are recreated
+        create_rollup_triggers(cursor)
+
+    _rebuild_table(conn, "expenses", '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            description TEXT,
+            category TEXT,
+            amount REAL,
+            last_updated TEXT,
+            import_hash INTEGER
+        )
+    ''', [
+        f"INSERT INTO {{new}} ({columns}) SELECT {columns} FROM expenses WHERE rowid BETWEEN ? AND ?"
+    ], finish)
+
+def _migration_epoch_days(conn):
+    # expenses.date (ISO text) and fund_history.last_updated (ISO strings and
+    # CURRENT_TIMESTAMP values) become integer epoch days
+    if _columns(conn.cursor(), "expenses").get("date") != "INTEGER":
+        def finish(cursor):
+            for statement in EXPENSE_INDEXES:
+                cursor.execute(statement)
+            # Year and month of every row are unchanged, so is the rollup
+            create_rollup_triggers(cursor)
+
+        _rebuild_table(conn, "expenses", EXPENSES_SCHEMA, [f'''
+            INSERT INTO {{new}} (id, date, description, category, amount, last_updated, import_hash)
+            SELECT id, {EPOCH_DAY.format(value="date")}, description, category, amount, last_updated, import_hash
+            FROM expenses WHERE rowid BETWEEN ? AND ?
+        '''], finish)
+
+    if _columns(conn.cursor(), "fund_history").get("last_updated") != "INTEGER":
+        _rebuild_table(conn, "fund_history", FUND_HISTORY_SCHEMA, [f'''
+            INSERT INTO {{new}} (fund_id, fixed_amount, actual_value, last_updated, cumulative_contribution)
+            SELECT fund_id, fixed_amount, actual_value, {EPOCH_DAY.format(value="last_updated")}, cumulative_contribution
+            FROM fund_history WHERE rowid BETWEEN ? AND ?
+            ORDER BY rowid
+        '''], finish=lambda cursor: cursor.execute(FUND_HISTORY_INDEX))
+        # Entries of the same day now tie on the date and are ordered by rowid
+        rebuild_fund_contributions(conn)
+
+    if _columns(conn.cursor(), "funds").get("last_updated") != "INTEGER":
+        conn.execute("ALTER TABLE funds DROP COLUMN last_updated")
+        conn.execute("ALTER TABLE funds ADD COLUMN last_updated INTEGER")
+    _sync_latest_fixed_amount(conn.cursor())
+    conn.commit()
+
+def _migration_fixed_item_history(conn):
+    cursor = conn.cursor()
+    for table, history in FIXED_ITEM_HISTORY.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {history} (
+                name TEXT NOT NULL,
+                amount REAL,  -- NULL: the item ends on valid_from
+                valid_from INTEGER NOT NULL,  -- epoch day
+                PRIMARY KEY (name, valid_from)
+            )
+        ''')
+        # Earlier changes were overwritten, so the current amounts are taken
+        # as valid since the beginning (the table is gone after version 12)
+        if _columns(cursor, table):
+            cursor.execute(f"INSERT OR IGNORE INTO {history} (name, amount, valid_from) SELECT name, amount, 0 FROM {table}")
+    conn.commit()
+
+def _migration_fixed_item_schedules(conn):
+    cursor = conn.cursor()
+    for table in [*FIXED_ITEM_HISTORY, *FIXED_ITEM_HISTORY.values()]:
+        columns = _columns(cursor, table)
+        if not columns:
+            continue
+        if "interval_months" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN interval_months INTEGER NOT NULL DEFAULT 1")
+        if "day" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN day INTEGER NOT NULL DEFAULT 1")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fixed_postings (
+            kind TEXT NOT NULL,  -- fixed_costs or fixed_income
+            date INTEGER NOT NULL,  -- epoch day
+            name TEXT NOT NULL,
+            amount REAL,
+            PRIMARY KEY (kind, date, name)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fixed_posting_months (
+            kind TEXT NOT NULL,
+            month INTEGER NOT NULL,  -- epoch day of the month's first day
+            PRIMARY KEY (kind, month)
+        )
+    ''')
+    conn.commit()
+
+def _migration_expense_search(conn):
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description, category,
+            content='expenses', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.commit()
+    rebuild_expense_search(conn)
+
+def _migration_expense_page_index(conn):
+    conn.execute(EXPENSE_PAGE_INDEX)
+    conn.commit()
+
+def _migration_drop_current_fixed_items(conn):
+    # The items in force are resolved from the history when read
+    conn.execute("DROP TABLE IF EXISTS fixed_costs")
+    conn.execute("DROP TABLE IF EXISTS fixed_income")
+    conn.commit()
+
+def _migration_posting_cache(conn):
+    # The posting cache moves to its own database (see _attach_posting_cache)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fixed_item_versions (
+            kind TEXT PRIMARY KEY,  -- fixed_costs or fixed_income
+            version INTEGER NOT NULL
+        )
+    """)
+    conn.execute("DROP TABLE IF EXISTS main.fixed_postings")
+    conn.execute("DROP TABLE IF EXISTS main.fixed_posting_months")
+    conn.commit()
+
+MIGRATIONS = [
+    _migration_base_tables,
+    _migration_expense_indexes,
+    _migration_import_hash,
+    _migration_monthly_rollup,
+    _migration_funds,
+    _migration_expenses_last_updated_text,
+    _migration_epoch_days,
+    _migration_fixed_item_history,
+    _migration_fixed_item_schedules,
+    _migration_expense_search,
+    _migration_expense_page_index,
+    _migration_drop_current_fixed_items,
+    _migration_posting_cache,
+]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    if version < len(MIGRATIONS):
+        _bump(conn, "*")
+
+def init_db(conn):
+    migrate(conn)
+
+# The rollup is maintained by triggers so that every write path (single
+# inserts, updates, deletes and bulk imports) keeps it current.
+# Year and month of an expense date, for the ISO text dates of schema
+# versions before 7 and for the epoch days since then
+ISO_DATE_PARTS = ("CAST(substr({date}, 1, 4) AS INTEGER)", "CAST(substr({date}, 6, 2) AS INTEGER)")
+EPOCH_DAY_PARTS = (
+    "CAST(strftime('%Y', {date} * 86400, 'unixepoch') AS INTEGER)",
+    "CAST(strftime('%m', {date} * 86400, 'unixepoch') AS INTEGER)",
+)
+
+ROLLUP_ADD = '''
+    INSERT INTO expense_monthly_rollup (year, month, category, total, count)
+    VALUES ({year}, {month}, COALESCE(NEW.category, ''), COALESCE(NEW.amount, 0), 1)
+    ON CONFLICT(year, month, category) DO UPDATE
+    SET total = total + excluded.total, count = count + 1;
+'''
+
+ROLLUP_OLD_KEY = '''
+    year = {year}
+    AND month = {month}
+    AND category = COALESCE(OLD.category, '')
+'''
+
+ROLLUP_REMOVE = '''
+    UPDATE expense_monthly_rollup
+    SET total = total - COALESCE(OLD.amount, 0), count = count - 1
+    WHERE {key};
+    DELETE FROM expense_monthly_rollup WHERE {key} AND count <= 0;
+'''
+
+ROLLUP_TRIGGERS = ["expenses_rollup_insert", "expenses_rollup_delete", "expenses_rollup_update"]
+
+ROLLUP_BACKFILL = '''
+    INSERT INTO expense_monthly_rollup (year, month, category, total, count)
+    SELECT {year}, {month}, COALESCE(category, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+    FROM expenses
+    WHERE rowid BETWEEN ? AND ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT(year, month, category) DO UPDATE
+    SET total = total + excluded.total, count = count + excluded.count
+'''
+
+def _date_parts(cursor, date):
+    # Follows the declared type of expenses.date, so migration steps written
+    # for ISO dates still work when they are re-run on a later schema
+    integer = _columns(cursor, "expenses").get("date") == "INTEGER"
+    year, month = EPOCH_DAY_PARTS if integer else ISO_DATE_PARTS
+    return {"year": year.format(date=date), "month": month.format(date=date)}
+
+def create_rollup_triggers(cursor):
+    add = ROLLUP_ADD.format(**_date_parts(cursor, "NEW.date"))
+    remove = ROLLUP_REMOVE.format(key=ROLLUP_OLD_KEY.format(**_date_parts(cursor, "OLD.date")))
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses BEGIN {add} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses BEGIN {remove} END")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF date, category, amount ON expenses
+        BEGIN {remove} {add} END
+    """)
+
+def rebuild_expense_rollup(conn):
+    # The triggers are installed together with clearing the rollup; rows that
+    # existed at that point are then summed up in batches while new writes
+    # already go through the triggers
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for trigger in ROLLUP_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("DELETE FROM expense_monthly_rollup")
+        create_rollup_triggers(conn.cursor())
+        upto = conn.execute("SELECT MAX(rowid) FROM expenses").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if upto is not None:
+        _in_batches(conn, "expenses", [ROLLUP_BACKFILL.format(**_date_parts(conn.cursor(), "date"))], last=upto)
+    _bump(conn, "expenses")
+
+def _epoch_day(value):
+    return int(pd.Timestamp(value).value // NS_PER_DAY)
+
+def _epoch_days(values):
+    # Vectorized _epoch_day; plain ints, since sqlite3 cannot bind NumPy integers
+    return (pd.to_datetime(values).to_numpy().astype("datetime64[ns]").astype("int64") // NS_PER_DAY).tolist()
+
+def _dates(days):
+    return pd.to_datetime(days, unit="D")
+
+# Full-text index over description and category. It is an external content
+# table: the text lives only in expenses, triggers keep the index in step.
+# Diacritics are folded, so "muller" finds "Müller".
+SEARCH_PAGE_SIZE = 20
+
+SEARCH_TRIGGERS = ["expenses_fts_insert", "expenses_fts_delete", "expenses_fts_update"]
+
+SEARCH_ADD = "INSERT INTO expenses_fts (rowid, description, category) VALUES (NEW.id, NEW.description, NEW.category);"
+SEARCH_REMOVE = '''
+    INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+    VALUES ('delete', OLD.id, OLD.description, OLD.category);
+'''
+
+def create_search_triggers(cursor):
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN {SEARCH_ADD} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN {SEARCH_REMOVE} END")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description, category ON expenses
+        BEGIN {SEARCH_REMOVE} {SEARCH_ADD} END
+    """)
+
+def rebuild_expense_search(conn):
+    # Same pattern as rebuild_expense_rollup: clear the index and install the
+    # triggers atomically, then index the existing rows in batches
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for trigger in SEARCH_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('delete-all')")
+        create_search_triggers(conn.cursor())
+        upto = conn.execute("SELECT MAX(rowid) FROM expenses").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if upto is not None:
+        _in_batches(conn, "expenses", ['''
+            INSERT INTO expenses_fts (rowid, description, category)
+            SELECT id, description, category FROM expenses WHERE rowid BETWEEN ? AND ?
+        '''], last=upto)
+    _bump(conn, "expenses")
+
+def _search_query(text):
+    # Every word of the input as a quoted prefix term, all of them required
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+@cached_reader("expenses")
+def count_expense_matches(conn, text):
+    query = _search_query(text)
+    if not query:
+        return 0
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM expenses_fts WHERE expenses_fts MATCH ?", (query,))
+    return cursor.fetchone()[0]
+
+@cached_reader("expenses")
+def search_expenses(conn, text, limit=SEARCH_PAGE_SIZE, offset=0):
+    # Best matches first (bm25, description weighted above category), newest
+    # first among equally good ones
+    query = _search_query(text)
+    if not query:
+        return _with_dates(pd.DataFrame(columns=["id", "date", "description", "category", "amount"]))
+    return _with_dates(pd.read_sql_query("""
+        SELECT e.id, e.date, e.description, e.category, e.amount
+        FROM expenses_fts
+        JOIN expenses e ON e.id = expenses_fts.rowid
+        WHERE expenses_fts MATCH ?
+        ORDER BY bm25(expenses_fts, 2.0, 1.0), e.date DESC, e.id DESC
+        LIMIT ? OFFSET ?
+    """, conn, params=(query, limit, offset)))
 
 def insert_expense(conn, date, description, category, amount):
     cursor = conn.cursor()
     cursor.execute("INSERT INTO expenses (date, description, category, amount) VALUES (?, ?, ?, ?)",
-                   (date, description, category, amount))
+                   (_epoch_day(date), description, category, amount))
     conn.commit()
+    _bump(conn, "expenses")
 
+def insert_expenses_bulk(conn, rows):
+    # rows: DataFrame with date/description/category/amount columns or an
+    # iterable of (date, description, category, amount) tuples
+    if isinstance(rows, pd.DataFrame):
+        rows = zip(
+            _epoch_days(rows["date"]),
+            rows["description"],
+            rows["category"],
+            rows["amount"].astype(float).tolist(),
+        )
+    else:
+        rows = ((_epoch_day(d), desc, cat, float(amount)) for d, desc, cat, amount in rows)
+
+    with conn:
+        cursor = conn.executemany(
+            "INSERT INTO expenses (date, description, category, amount) VALUES (?, ?, ?, ?)", rows
+        )
+    _bump(conn, "expenses")
+    return cursor.rowcount
+
+def import_expenses_bulk(conn, df):
+    # Like insert_expenses_bulk, but rows whose import_hash is already stored
+    # are skipped, which makes re-importing a statement idempotent
+    rows = zip(
+        _epoch_days(df["date"]),
+        df["description"],
+        df["category"],
+        df["amount"].astype(float).tolist(),
+        df["import_hash"].astype("int64").tolist(),
+    )
+    with conn:
+        cursor = conn.executemany("""
+            INSERT OR IGNORE INTO expenses (date, description, category, amount, import_hash)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+    _bump(conn, "expenses")
+    return cursor.rowcount
+
+@cached_reader("expenses")
 def get_expenses(conn):
-    return pd.read_sql_query("SELECT * FROM expenses ORDER BY date DESC", conn)
+    df = pd.read_sql_query("SELECT * FROM expenses ORDER BY date DESC", conn)
+    df["date"] = _dates(df["date"])
+    return df
+
+EXPENSE_COLUMNS = ["id", "date", "description", "category", "amount", "last_updated"]
+
+def _expenses_between_query(start, end, categories, columns):
+    columns = columns or EXPENSE_COLUMNS
+    unknown = [col for col in columns if col not in EXPENSE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown expense columns: {unknown}")
+
+    query = f"SELECT {', '.join(columns)} FROM expenses WHERE date >= ? AND date <= ?"
+    params = [_epoch_day(start), _epoch_day(end)]
+    if categories:
+        query += f" AND category IN ({', '.join('?' * len(categories))})"
+        params.extend(categories)
+    query += " ORDER BY date DESC"
+    return query, params
+
+@cached_reader("expenses")
+def get_expenses_between(conn, start, end, categories=None, columns=None):
+    # start and end are inclusive; both are matched against the date index
+    query, params = _expenses_between_query(start, end, categories, columns)
+    return _with_dates(pd.read_sql_query(query, conn, params=params))
+
+def _with_dates(df):
+    if "date" in df:
+        df["date"] = _dates(df["date"])
+    return df
+
+@cached_reader("expenses")
+def get_expenses_typed(conn, start, end, categories=None):
+    # Compact frame for charts: datetime64 dates, categorical categories,
+    # Arrow-backed descriptions and integer cents (exact sums, no float drift)
+    df = get_expenses_between.uncached(
+        conn, start, end, categories, columns=["id", "date", "description", "category", "amount"]
+    )
+    return pd.DataFrame({
+        "id": df["id"].astype("int64"),
+        "date": df["date"],
+        "description": df["description"].astype("string[pyarrow]"),
+        "category": df["category"].astype("category"),
+        "amount_cents": (pd.to_numeric(df["amount"]).fillna(0) * 100).round().astype("int64"),
+    })
+
+def iter_expenses_between(conn, start, end, categories=None, columns=None, chunksize=10_000):
+    # Same rows as get_expenses_between, yielded as DataFrames of at most chunksize rows
+    query, params = _expenses_between_query(start, end, categories, columns)
+    for chunk in pd.read_sql_query(query, conn, params=params, chunksize=chunksize):
+        yield _with_dates(chunk)
+
+@cached_reader("expenses")
+def get_expense_years(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT year FROM expense_monthly_rollup ORDER BY year DESC")
+    return [row[0] for row in cursor.fetchall()]
+
+@cached_reader("expenses")
+def get_monthly_rollup(conn, year=None):
+    query = "SELECT year, month, category, ROUND(total, 2) AS total, count FROM expense_monthly_rollup"
+    params = ()
+    if year is not None:
+        query += " WHERE year = ?"
+        params = (year,)
+    query += " ORDER BY year, month, category"
+    return pd.read_sql_query(query, conn, params=params)
+
+# Keyset pagination: a page continues after the last row of the previous
+# one in (date, id) order, newest first. Unlike OFFSET, every page costs the
+# same no matter how far into the table it is.
+EXPENSE_PAGE_SIZE = 25
+
+@cached_reader("expenses")
+def get_expense_page(conn, after=None, limit=EXPENSE_PAGE_SIZE, start=None, end=None):
+    # after: (date, id) of the last row of the previous page, None for the
+    # first page; start and end optionally bound the dates (inclusive)
+    low = _epoch_day(start) if start is not None else -2 ** 63
+    high = _epoch_day(end) if end is not None else 2 ** 63 - 1
+    query = "SELECT id, date, description, category, amount FROM expenses WHERE date >= ? AND date <= ?"
+    params = [low, high]
+    if after is not None:
+        day, id = _epoch_day(after[0]), int(after[1])
+        params[1] = min(high, day)
+        query += " AND (date < ? OR id < ?)"
+        params.extend([day, id])
+    query += " ORDER BY date DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return _with_dates(pd.read_sql_query(query, conn, params=params))
 
 def update_expense(conn, id, date, description, category, amount):
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE expenses SET date=?, description=?, category=?, amount=? WHERE id=?",
-        (date, description, category, amount, id))
+        (_epoch_day(date), description, category, amount, id))
     conn.commit()
+    _bump(conn, "expenses")
+
+def update_expenses(conn, rows):
+    # rows: DataFrame with id/date/description/category/amount columns; all
+    # rows are written in one transaction
+    rows = zip(
+        _epoch_days(rows["date"]),
+        rows["description"],
+        rows["category"],
+        rows["amount"].astype(float).tolist(),
+        rows["id"].astype("int64").tolist(),
+    )
+    with conn:
+        conn.executemany("UPDATE expenses SET date=?, description=?, category=?, amount=? WHERE id=?", rows)
+    _bump(conn, "expenses")
 
 def delete_expense(conn, id):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM expenses WHERE id=?", (id,))
     conn.commit()
+    _bump(conn, "expenses")
+
+def delete_expenses(conn, ids):
+    with conn:
+        conn.executemany("DELETE FROM expenses WHERE id=?", ((int(id),) for id in ids))
+    _bump(conn, "expenses")
 
-def upsert_fixed_cost(conn, name, amount):
-    today = date.today().isoformat()
+# Fixed costs and incomes keep every change in a history table with the day
+# it takes effect (epoch day) and its schedule: a posting every
+# interval_months months on the given day of the month. A NULL amount marks
+# the end of an item. The items in force are resolved from the history when
+# they are read, so a change scheduled for a later month shows up once that
+# month has come.
+FIXED_ITEM_HISTORY = {"fixed_costs": "fixed_cost_history", "fixed_income": "fixed_income_history"}
+
+def _month_start(value=None):
+    return (pd.Timestamp(value) if value is not None else pd.Timestamp.today()).replace(day=1)
+
+def _fixed_item_in_force(cursor, history, name, day):
+    # (amount, interval_months, day) of the item on the given epoch day
+    return cursor.execute(f"""
+        SELECT amount, interval_months, day FROM {history}
+        WHERE name = ? AND valid_from <= ?
+        ORDER BY valid_from DESC
+        LIMIT 1
+    """, (name, day)).fetchone()
+
+def _set_fixed_items(conn, table, items):
+    # items: (name, amount, valid_from, interval_months, day) tuples, written
+    # in one transaction; valid_from defaults to the first day of the current
+    # month. A None amount ends the item: changes scheduled after it are
+    # dropped, so the item cannot come back. Items that already have these
+    # values on valid_from are skipped instead of adding a history row.
+    history = FIXED_ITEM_HISTORY[table]
     cursor = conn.cursor()
+    items = [
+        (name, amount, _epoch_day(_month_start() if valid_from is None else valid_from), interval_months, day)
+        for name, amount, valid_from, interval_months, day in items
+    ]
+    items = [
+        item for item in items
+        if item[1] is None or _fixed_item_in_force(cursor, history, item[0], item[2]) != (item[1], *item[3:])
+    ]
+    if not items:
+        return
+    cursor.executemany(f"DELETE FROM {history} WHERE name = ? AND valid_from > ?",
+                       [(name, valid_from) for name, amount, valid_from, *_ in items if amount is None])
+    cursor.executemany(f"""
+        INSERT INTO {history} (name, amount, valid_from, interval_months, day) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name, valid_from) DO UPDATE
+        SET amount=excluded.amount, interval_months=excluded.interval_months, day=excluded.day
+    """, items)
     cursor.execute("""
-        INSERT INTO fixed_costs (name, amount, last_updated) VALUES (?, ?, ?)
-        ON CONFLICT(name) DO UPDATE SET amount=excluded.amount, last_updated=excluded.last_updated
-    """, (name, amount, today))
+        INSERT INTO fixed_item_versions (kind, version) VALUES (?, 1)
+        ON CONFLICT(kind) DO UPDATE SET version = version + 1
+    """, (table,))
     conn.commit()
+    _bump(conn, history)
+
+def _set_fixed_item(conn, table, name, amount, valid_from, interval_months=1, day=1):
+    _set_fixed_items(conn, table, [(name, amount, valid_from, interval_months, day)])
+
+def _fixed_item_items(rows, valid_from):
+    # DataFrame rows (name/amount/interval_months/day, optionally valid_from)
+    # as _set_fixed_items tuples. A change takes effect on valid_from, or on
+    # the row's own valid_from if that is later.
+    valid_from = _month_start() if valid_from is None else pd.Timestamp(valid_from)
+    starts = rows["valid_from"] if "valid_from" in rows else pd.Series(pd.NaT, index=rows.index)
+    return [
+        (name, None if pd.isna(amount) else float(amount),
+         valid_from if pd.isna(start) else max(valid_from, pd.Timestamp(start)),
+         int(interval_months), int(day))
+        for name, amount, start, interval_months, day
+        in zip(rows["name"], rows["amount"], starts, rows["interval_months"], rows["day"])
+    ]
+
+# The listed items: per name the row in force on `today` or, for items that
+# only start later, the first scheduled one. Ended items are left out.
+# Keyset pagination by name.
+FIXED_ITEM_PAGE_SIZE = 25
+
+@cached_reader(*FIXED_ITEM_HISTORY.values())
+def _fixed_item_page(conn, table, today, after, limit):
+    history = FIXED_ITEM_HISTORY[table]
+    df = pd.read_sql_query(f"""
+        SELECT name, amount, valid_from, interval_months, day FROM (
+            SELECT name, amount, valid_from, interval_months, day,
+                   ROW_NUMBER() OVER (PARTITION BY name ORDER BY valid_from > :today, valid_from) AS position
+            FROM {history} h
+            WHERE amount IS NOT NULL
+              AND (:after IS NULL OR name > :after)
+              AND (valid_from > :today OR valid_from = (
+                  SELECT MAX(valid_from) FROM {history} WHERE name = h.name AND valid_from <= :today
+              ))
+        )
+        WHERE position = 1
+        ORDER BY name
+        LIMIT :limit
+    """, conn, params={"today": today, "after": after, "limit": limit})
+    df["valid_from"] = _dates(df["valid_from"])
+    return df
+
+def _read_fixed_item_history(conn, table):
+    df = pd.read_sql_query(f"""
+        SELECT name, amount, valid_from, interval_months, day FROM {FIXED_ITEM_HISTORY[table]}
+        ORDER BY valid_from, name
+    """, conn)
+    df["valid_from"] = _dates(df["valid_from"])
+    return df
+
+def upsert_fixed_cost(conn, name, amount, valid_from=None, interval_months=1, day=1):
+    _set_fixed_item(conn, "fixed_costs", name, amount, valid_from, interval_months, day)
 
 def get_fixed_costs(conn):
-    return pd.read_sql_query("SELECT name, amount, last_updated FROM fixed_costs", conn)
+    return get_fixed_costs_page(conn, limit=-1)
 
-def delete_fixed_cost(conn, name):
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM fixed_costs WHERE name=?", (name,))
-    conn.commit()
+@cached_reader("fixed_cost_history")
+def get_fixed_cost_history(conn):
+    return _read_fixed_item_history(conn, "fixed_costs")
 
-def upsert_fixed_income(conn, name, amount):
-    today = date.today().isoformat()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO fixed_income (name, amount, last_updated) VALUES (?, ?, ?)
-        ON CONFLICT(name) DO UPDATE SET amount=excluded.amount, last_updated=excluded.last_updated
-    """, (name, amount, today))
-    conn.commit()
+def delete_fixed_cost(conn, name, valid_from=None):
+    # Ends the cost; months before valid_from keep it
+    _set_fixed_item(conn, "fixed_costs", name, None, valid_from)
+
+def set_fixed_costs(conn, rows, valid_from=None):
+    # Batched upsert_fixed_cost/delete_fixed_cost: rows is a DataFrame with
+    # name/amount/interval_months/day columns, a missing amount ends the cost
+    _set_fixed_items(conn, "fixed_costs", _fixed_item_items(rows, valid_from))
+
+def get_fixed_costs_page(conn, after=None, limit=FIXED_ITEM_PAGE_SIZE):
+    # after: name of the last item of the previous page
+    return _fixed_item_page(conn, "fixed_costs", _epoch_day(date.today()), after, limit)
+
+def upsert_fixed_income(conn, name, amount, valid_from=None, interval_months=1, day=1):
+    _set_fixed_item(conn, "fixed_income", name, amount, valid_from, interval_months, day)
 
 def get_fixed_incomes(conn):
-    return pd.read_sql_query("SELECT name, amount, last_updated FROM fixed_income", conn)
+    return get_fixed_incomes_page(conn, limit=-1)
 
-def delete_fixed_income(conn, name):
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM fixed_income WHERE name=?", (name,))
+@cached_reader("fixed_income_history")
+def get_fixed_income_history(conn):
+    return _read_fixed_item_history(conn, "fixed_income")
+
+def delete_fixed_income(conn, name, valid_from=None):
+    _set_fixed_item(conn, "fixed_income", name, None, valid_from)
+
+def set_fixed_incomes(conn, rows, valid_from=None):
+    _set_fixed_items(conn, "fixed_income", _fixed_item_items(rows, valid_from))
+
+def get_fixed_incomes_page(conn, after=None, limit=FIXED_ITEM_PAGE_SIZE):
+    return _fixed_item_page(conn, "fixed_income", _epoch_day(date.today()), after, limit)
+
+# Postings of the fixed items are generated on demand and cached per month in
+# fixed_postings; fixed_posting_months records which months are expanded.
+# The cache lives in its own database next to the main one, so filling it
+# leaves PRAGMA data_version of the main database alone and reading postings
+# does not invalidate the read cache of other connections.
+# fixed_item_versions (main database) counts the changes of each kind; a
+# cache built for another version is discarded.
+POSTING_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS posting_cache.fixed_postings (
+        kind TEXT NOT NULL,  -- fixed_costs or fixed_income
+        date INTEGER NOT NULL,  -- epoch day
+        name TEXT NOT NULL,
+        amount REAL,
+        PRIMARY KEY (kind, date, name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS posting_cache.fixed_posting_months (
+        kind TEXT NOT NULL,
+        month INTEGER NOT NULL,  -- epoch day of the month's first day
+        PRIMARY KEY (kind, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS posting_cache.posting_versions (
+        kind TEXT PRIMARY KEY,
+        version INTEGER NOT NULL  -- fixed_item_versions.version the cache was built for
+    )
+    """,
+]
+
+def _attach_posting_cache(conn):
+    # <name>_postings.db next to the database file; in memory for in-memory databases
+    databases = {row[1]: row[2] for row in conn.execute("PRAGMA database_list")}
+    if "posting_cache" in databases:
+        return
+    main = databases.get("main")
+    path = f"{os.path.splitext(main)[0]}_postings.db" if main else ":memory:"
+    conn.execute("ATTACH DATABASE ? AS posting_cache", (path,))
+    conn.execute("PRAGMA posting_cache.journal_mode=WAL")
+    for statement in POSTING_CACHE_SCHEMA:
+        conn.execute(statement)
     conn.commit()
 
+def _materialize_postings(conn, table, start, end):
+    months = [_epoch_day(month) for month in month_range(start, end)]
+    if not months:
+        return
+    _attach_posting_cache(conn)
+    cursor = conn.cursor()
+    # The version is read before the history: if the history changes in
+    # between, the cache is labelled with the older version and rebuilt
+    row = cursor.execute("SELECT version FROM fixed_item_versions WHERE kind = ?", (table,)).fetchone()
+    version = row[0] if row else 0
+    cached = cursor.execute("SELECT version FROM posting_cache.posting_versions WHERE kind = ?", (table,)).fetchone()
+    with conn:
+        if cached is None or cached[0] != version:
+            cursor.execute("DELETE FROM posting_cache.fixed_postings WHERE kind = ?", (table,))
+            cursor.execute("DELETE FROM posting_cache.fixed_posting_months WHERE kind = ?", (table,))
+            cursor.execute("INSERT OR REPLACE INTO posting_cache.posting_versions (kind, version) VALUES (?, ?)",
+                           (table, version))
+            expanded = set()
+        else:
+            cursor.execute(
+                "SELECT month FROM posting_cache.fixed_posting_months WHERE kind = ? AND month BETWEEN ? AND ?",
+                (table, months[0], months[-1])
+            )
+            expanded = {row[0] for row in cursor.fetchall()}
+        missing = [month for month in months if month not in expanded]
+        if not missing:
+            return
+
+        # One pass over the span of the missing months; postings of months
+        # already cached in between are identical and ignored
+        first = _dates(missing[0])
+        last = _dates(missing[-1]) + pd.offsets.MonthEnd(0)
+        history = _read_fixed_item_history(conn, table)
+        for chunk in iter_postings(history, first, last):
+            cursor.executemany(
+                "INSERT OR IGNORE INTO posting_cache.fixed_postings (kind, date, name, amount) VALUES (?, ?, ?, ?)",
+                zip([table] * len(chunk), _epoch_days(chunk["date"]), chunk["name"], chunk["amount"].tolist())
+            )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO posting_cache.fixed_posting_months (kind, month) VALUES (?, ?)",
+            [(table, month) for month in missing]
+        )
+
+@cached_reader(*FIXED_ITEM_HISTORY.values())
+def _read_postings(conn, table, start, end):
+    if not len(month_range(start, end)):
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "name": [], "amount": []})
+    df = pd.read_sql_query("""
+        SELECT date, name, amount FROM posting_cache.fixed_postings
+        WHERE kind = ? AND date BETWEEN ? AND ?
+        ORDER BY date, name
+    """, conn, params=(table, _epoch_day(start), _epoch_day(end)))
+    df["date"] = _dates(df["date"])
+    return df
+
+def get_fixed_cost_postings(conn, start, end):
+    # Filled outside the cached reader: the cache is written, the read is memoized
+    _materialize_postings(conn, "fixed_costs", start, end)
+    return _read_postings(conn, "fixed_costs", start, end)
+
+def get_fixed_income_postings(conn, start, end):
+    _materialize_postings(conn, "fixed_income", start, end)
+    return _read_postings(conn, "fixed_income", start, end)
+
+@cached_reader("income")
 def get_income_dict(conn):
     df = pd.read_sql_query("SELECT * FROM income", conn)
     return df.set_index("type")["amount"].to_dict()
 
+FUND_HISTORY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        fund_id INTEGER NOT NULL REFERENCES funds(id) ON DELETE CASCADE,
+        fixed_amount REAL,
+        actual_value REAL,
+        last_updated INTEGER,  -- epoch day
+        cumulative_contribution REAL
+    )
+'''
+
+FUND_HISTORY_INDEX = "CREATE INDEX IF NOT EXISTS idx_fund_history_fund_date ON fund_history(fund_id, last_updated)"
+
+# Entry columns as the pages know them, with the fund name joined in
+FUND_HISTORY_SELECT = '''
+    SELECT f.name, h.fixed_amount, h.actual_value, h.last_updated, h.cumulative_contribution
+    FROM fund_history h
+    JOIN funds f ON f.id = h.fund_id
+'''
+
+def _read_fund_history(query, conn, params=()):
+    df = pd.read_sql_query(query, conn, params=params)
+    df["last_updated"] = _dates(df["last_updated"])
+    return df
+
+def _fund_ids(cursor, names, create=False):
+    names = list(dict.fromkeys(names))
+    if create:
+        cursor.executemany("INSERT OR IGNORE INTO funds (name) VALUES (?)", [(name,) for name in names])
+    ids = {}
+    for offset in range(0, len(names), 500):
+        batch = names[offset:offset + 500]
+        cursor.execute(
+            f"SELECT name, id FROM funds WHERE name IN ({', '.join('?' * len(batch))})", batch
+        )
+        ids.update(cursor.fetchall())
+    return ids
+
+def _fund_id(cursor, name, create=False):
+    return _fund_ids(cursor, [name], create).get(name)
+
+def _sync_latest_fixed_amount(cursor, fund_ids=None):
+    # funds.fixed_amount follows the latest entry of each fund
+    only = ""
+    if fund_ids is not None:
+        only = f"WHERE fund_id IN ({', '.join(str(int(fund_id)) for fund_id in fund_ids) or 'NULL'})"
+    cursor.execute(f'''
+        UPDATE funds
+        SET fixed_amount = latest.fixed_amount, last_updated = latest.last_updated
+        FROM (
+            SELECT fund_id, fixed_amount, last_updated,
+                   ROW_NUMBER() OVER (PARTITION BY fund_id ORDER BY last_updated DESC, rowid DESC) AS rn
+            FROM fund_history
+            {only}
+        ) AS latest
+        WHERE latest.fund_id = funds.id AND latest.rn = 1
+    ''')
+
+@cached_reader("funds")
 def get_all_fund_names(conn):
     cursor = conn.cursor()
-    cursor.execute("SELECT name FROM funds")
+    cursor.execute("SELECT name FROM funds ORDER BY id")
     return [row[0] for row in cursor.fetchall()]
 
+@cached_reader("funds")
 def get_current_fixed_amount(conn, fund_name):
     cursor = conn.cursor()
     cursor.execute("SELECT fixed_amount FROM funds WHERE name = ?", (fund_name,))
     result = cursor.fetchone()
-    return result[0] if result else 0.0
+    return (result[0] or 0.0) if result else 0.0
 
 def update_fixed_amount(conn, fund_name, new_amount):
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE funds
-        SET fixed_amount = ?, last_updated = CURRENT_TIMESTAMP
+        SET fixed_amount = ?, last_updated = ?
         WHERE name = ?
-    """, (new_amount, fund_name))
+    """, (new_amount, _epoch_day(date.today()), fund_name))
     conn.commit()
+    _bump(conn, "funds")
 
-def insert_fund_entry(conn, name, fixed_amount, actual_value, timestamp=None):
-    if not timestamp:
-        timestamp = pd.Timestamp.now()
+# cumulative_contribution is the running sum of fixed_amount per fund in
+# (last_updated, rowid) order. Writers keep it current, so the invested total
+# at any entry is a lookup instead of a cumsum over the whole history.
+def rebuild_fund_contributions(conn, batch_size=100):
+    # Batched by fund id, every fund is rewritten as a whole
+    _in_batches(conn, "funds", ['''
+        UPDATE fund_history
+        SET cumulative_contribution = running.total
+        FROM (
+            SELECT rowid AS rid,
+                   SUM(COALESCE(fixed_amount, 0)) OVER (PARTITION BY fund_id ORDER BY last_updated, rowid) AS total
+            FROM fund_history
+            WHERE fund_id BETWEEN ? AND ?
+        ) AS running
+        WHERE fund_history.rowid = running.rid
+    '''], batch_size=batch_size)
+    _bump(conn, "fund_history", "funds")
+
+def _contribution_before(cursor, fund_id, day, inclusive=False):
+    cursor.execute(f"""
+        SELECT cumulative_contribution FROM fund_history
+        WHERE fund_id = ? AND last_updated {'<=' if inclusive else '<'} ?
+        ORDER BY last_updated DESC, rowid DESC
+        LIMIT 1
+    """, (fund_id, day))
+    row = cursor.fetchone()
+    return (row[0] or 0.0) if row else 0.0
+
+def _recalculate_contributions(cursor, fund_id, since):
+    # Rewrites the running total of one fund from `since` on; earlier entries keep theirs
+    cursor.execute('''
+        UPDATE fund_history
+        SET cumulative_contribution = running.total + ?
+        FROM (
+            SELECT rowid AS rid, SUM(COALESCE(fixed_amount, 0)) OVER (ORDER BY last_updated, rowid) AS total
+            FROM fund_history
+            WHERE fund_id = ? AND last_updated >= ?
+        ) AS running
+        WHERE fund_history.rowid = running.rid
+    ''', (_contribution_before(cursor, fund_id, since), fund_id, since))
 
-    # Convert to ISO string
-    timestamp_str = timestamp.isoformat()
+def insert_fund_entry(conn, name, fixed_amount, actual_value, timestamp=None):
+    day = _epoch_day(timestamp or date.today())
 
     cursor = conn.cursor()
+    fund_id = _fund_id(cursor, name, create=True)
+    previous = _contribution_before(cursor, fund_id, day, inclusive=True)
+    cursor.execute("""
+        INSERT INTO fund_history (fund_id, fixed_amount, actual_value, last_updated, cumulative_contribution)
+        VALUES (?, ?, ?, ?, ?)
+    """, (fund_id, fixed_amount, actual_value, day, previous + (fixed_amount or 0)))
+    # Back-dated entry: only the entries after it move
     cursor.execute("""
-        INSERT INTO fund_history (name, fixed_amount, actual_value, last_updated)
-        VALUES (?, ?, ?, ?)
-    """, (name, fixed_amount, actual_value, timestamp_str))
+        UPDATE fund_history
+        SET cumulative_contribution = cumulative_contribution + ?
+        WHERE fund_id = ? AND last_updated > ?
+    """, (fixed_amount or 0, fund_id, day))
+    if cursor.rowcount == 0:
+        # Newest entry of the fund
+        cursor.execute(
+            "UPDATE funds SET fixed_amount = ?, last_updated = ? WHERE id = ?",
+            (fixed_amount, day, fund_id)
+        )
     conn.commit()
+    _bump(conn, "fund_history", "funds")
+
+def insert_fund_entries_bulk(conn, rows):
+    # rows: DataFrame with name/fixed_amount/actual_value/last_updated columns
+    # or an iterable of (name, fixed_amount, actual_value, date) tuples
+    if isinstance(rows, pd.DataFrame):
+        rows = zip(
+            rows["name"],
+            rows["fixed_amount"].astype(float).tolist(),
+            rows["actual_value"].astype(float).tolist(),
+            _epoch_days(rows["last_updated"]),
+        )
+    else:
+        rows = (
+            (name, float(fixed), float(actual), _epoch_day(ts))
+            for name, fixed, actual, ts in rows
+        )
+    rows = list(rows)
+
+    # Running totals are recalculated per fund from its earliest new entry on
+    since = {}
+    for name, _, _, day in rows:
+        if name not in since or day < since[name]:
+            since[name] = day
 
+    with conn:
+        cursor = conn.cursor()
+        ids = _fund_ids(cursor, since, create=True)
+        cursor.executemany("""
+            INSERT INTO fund_history (fund_id, fixed_amount, actual_value, last_updated)
+            VALUES (?, ?, ?, ?)
+        """, [(ids[name], fixed, actual, day) for name, fixed, actual, day in rows])
+        inserted = cursor.rowcount
+        for name, day in since.items():
+            _recalculate_contributions(cursor, ids[name], day)
+        _sync_latest_fixed_amount(cursor, ids.values())
+    _bump(conn, "fund_history", "funds")
+    return inserted
+
+@cached_reader("fund_history", "funds")
 def get_fund_history(conn, name):
-    return pd.read_sql_query(
-        "SELECT * FROM fund_history WHERE name = ? ORDER BY last_updated",
+    return _read_fund_history(
+        FUND_HISTORY_SELECT + "WHERE h.fund_id = (SELECT id FROM funds WHERE name = ?) ORDER BY h.last_updated, h.rowid",
         conn, params=(name,)
     )
 
+@cached_reader("fund_history", "funds")
+def get_all_fund_histories(conn):
+    return _read_fund_history(FUND_HISTORY_SELECT + "ORDER BY f.name, h.last_updated, h.rowid", conn)
+
+@cached_reader("fund_history", "funds")
+def get_latest_fund_snapshot(conn):
+    # One index seek on (fund_id, last_updated) per fund
+    return _read_fund_history(FUND_HISTORY_SELECT + """
+        WHERE h.rowid = (
+            SELECT rowid FROM fund_history
+            WHERE fund_id = f.id
+            ORDER BY last_updated DESC, rowid DESC
+            LIMIT 1
+        )
+        ORDER BY f.name
+    """, conn)
+
+@cached_reader("fund_history", "funds")
 def get_latest_fixed_amount(conn, name):
     cursor = conn.cursor()
     cursor.execute("""
         SELECT fixed_amount FROM fund_history
-        WHERE name = ?
-        ORDER BY last_updated DESC
+        WHERE fund_id = (SELECT id FROM funds WHERE name = ?)
+        ORDER BY last_updated DESC, rowid DESC
         LIMIT 1
     """, (name,))
     row = cursor.fetchone()
     return row[0] if row else 0.0
 
-def get_all_fund_names(conn):
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT name FROM fund_history")
-    return [row[0] for row in cursor.fetchall()]
+# Mean and standard deviation of the simulated monthly growth per fund type
+DUMMY_FUND_GROWTH = {
+    "Rente": (0.002, 0.001),           # ~0.2% monthly
+    "Nachhaltigkeit": (0.004, 0.003),  # ~0.4% ± more fluctuation
+    "Aktien": (0.007, 0.01),           # more volatile
+    "ETFs": (0.005, 0.004),            # ~0.5%
+}
 
-def populate_dummy_fund_data(conn):
-    names = ["Rente", "Nachhaltigkeit", "Aktien", "ETFs"]
+def populate_dummy_fund_data(conn, names=None, months_back=30, seed=None):
+    # Unknown fund names (e.g. synthetic benchmark funds) cycle through the
+    # growth profiles above
+    names = list(names or DUMMY_FUND_GROWTH)
+    profiles = list(DUMMY_FUND_GROWTH.values())
+    rng = np.random.default_rng(seed)
     end_date = pd.Timestamp.today().replace(day=1)
-    months_back = 30
     start_date = end_date - pd.DateOffset(months=months_back)
+    dates = pd.date_range(start_date, periods=months_back + 1, freq="MS")
+
+    mean, std = np.array([
+        DUMMY_FUND_GROWTH.get(name, profiles[i % len(profiles)]) for i, name in enumerate(names)
+    ]).T
+    growth = 1 + rng.normal(mean[:, None], std[:, None], size=(len(names), len(dates)))
+    fixed = 100 + 10 * (np.arange(len(dates)) % 3)
+    floor = np.cumsum(fixed) * 0.95  # keep it realistic
+
+    # The floor makes the recurrence non-linear, so step through the months
+    # while computing all funds at once
+    actual = np.zeros_like(growth)
+    previous = np.zeros(len(names))
+    for i in range(len(dates)):
+        previous = np.maximum(previous * growth[:, i] + fixed[i], floor[i])
+        actual[:, i] = previous
 
-    for name in names:
-        cumulative = 0
-        actual = 0
-        for i in range(months_back + 1):
-            date = (start_date + pd.DateOffset(months=i)).replace(day=1)
-            fixed = 100 + 10 * (i % 3)
-            cumulative += fixed
-
-            # Simulate realistic monthly growth depending on fund type
-            if name == "Rente":
-                growth_factor = 1 + np.random.normal(0.002, 0.001)  # ~0.2% monthly
-            elif name == "Nachhaltigkeit":
-                growth_factor = 1 + np.random.normal(0.004, 0.003)  # ~0.4% ± more fluctuation
-            elif name == "ETFs":
-                growth_factor = 1 + np.random.normal(0.005, 0.004)  # ~0.5%
-            else:  # "Aktien"
-                growth_factor = 1 + np.random.normal(0.007, 0.01)  # more volatile
-
-            actual = max(actual * growth_factor + fixed, cumulative * 0.95)  # keep it realistic
-            insert_fund_entry(conn, name, fixed, round(actual, 2), timestamp=date)
+    insert_fund_entries_bulk(conn, pd.DataFrame({
+        "name": np.repeat(names, len(dates)),
+        "fixed_amount": np.tile(fixed, len(names)),
+        "actual_value": actual.round(2).ravel(),
+        "last_updated": np.tile(dates, len(names)),
+    }))
+
+DUMMY_EXPENSE_CATEGORIES = ["Lebensmittel", "Utensilien", "Mobilität", "Freizeit", "Hund", "Wolle", "Familie", "Sonstiges"]
+
+def populate_dummy_expenses(conn, count, years=3, seed=None, chunksize=100_000):
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today().normalize()
+    days = int((end - (end - pd.DateOffset(years=years))).days)
+    for offset in range(0, count, chunksize):
+        size = min(chunksize, count - offset)
+        insert_expenses_bulk(conn, pd.DataFrame({
+            "date": end - pd.to_timedelta(rng.integers(0, days, size), unit="D"),
+            "description": np.char.add("Einkauf ", rng.integers(0, 1000, size).astype(str)),
+            "category": rng.choice(DUMMY_EXPENSE_CATEGORIES, size),
+            "amount": rng.lognormal(2.5, 0.8, size).round(2),
+        }))
 
 def delete_fund(conn, name):
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM fund_history WHERE name = ?", (name,))
+    # Removes the whole series, so no other fund's running total changes
+    cursor.execute("DELETE FROM fund_history WHERE fund_id = (SELECT id FROM funds WHERE name = ?)", (name,))
     cursor.execute("DELETE FROM funds WHERE name = ?", (name,))
     conn.commit()
+    _bump(conn, "fund_history", "funds")
 
 def clear_fund_data(conn):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM fund_history")
-    conn.commit()
\ No newline at end of file
+    cursor.execute("DELETE FROM funds")
+    conn.commit()
+    _bump(conn, "fund_history", "funds")
\ No newline at end of file
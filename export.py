@@ -0,0 +1,86 @@
+# export.py
+# Builds report downloads. Rows are streamed from SQLite in chunks, and the
+# Streamlit helper below only builds a file once the user asks for it.
+import io
+import json
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+from db import iter_expenses_between
+
+EXPORT_CHUNK_SIZE = 10_000
+
+REPORT_COLUMNS = {
+    "date": "Datum",
+    "description": "Beschreibung",
+    "category": "Kategorie",
+    "amount": "Betrag (€)",
+}
+
+EXPENSE_SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("description", pa.string()),
+    ("category", pa.string()),
+    ("amount", pa.float64()),
+])
+
+
+def expense_report_csv(conn, start, end, summary, chunksize=EXPORT_CHUNK_SIZE):
+    # Summary block, an empty line, then all expenses of the period
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+    summary.to_csv(text, index=False)
+    text.write("\n")
+
+    header = True
+    for chunk in iter_expenses_between(conn, start, end, columns=list(REPORT_COLUMNS), chunksize=chunksize):
+        chunk.rename(columns=REPORT_COLUMNS).to_csv(text, index=False, header=header, date_format="%Y-%m-%d")
+        header = False
+    if header:
+        text.write(",".join(REPORT_COLUMNS.values()) + "\n")
+
+    text.flush()
+    return buffer.getvalue()
+
+
+def expenses_parquet(conn, start, end, summary=None, chunksize=EXPORT_CHUNK_SIZE):
+    # Row groups are written chunk by chunk; the summary (if any) is stored
+    # as JSON in the file metadata
+    schema = EXPENSE_SCHEMA
+    if summary is not None:
+        schema = schema.with_metadata({"summary": json.dumps(summary.to_dict(orient="records"), default=str)})
+
+    buffer = io.BytesIO()
+    with pq.ParquetWriter(buffer, schema, compression="zstd") as writer:
+        for chunk in iter_expenses_between(conn, start, end, columns=EXPENSE_SCHEMA.names, chunksize=chunksize):
+            if chunk.empty:
+                continue
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    return buffer.getvalue()
+
+
+def lazy_download_button(prepare_label, label, build, file_name, mime, key, version=None):
+    # The payload is built only when the prepare button is clicked and kept in
+    # the session until it has been downloaded. version identifies the data it
+    # was built from (see db.data_version); once that changes, the payload is
+    # dropped and has to be prepared again.
+    state_key = f"export_{key}"
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and prepared[:2] != (file_name, version):
+        del st.session_state[state_key]
+        prepared = None
+    if prepared is None:
+        if not st.button(prepare_label, key=f"{key}_prepare"):
+            return
+        with st.spinner("Export wird erstellt..."):
+            prepared = (file_name, version, build())
+        st.session_state[state_key] = prepared
+
+    st.download_button(
+        label=label,
+        data=prepared[2],
+        file_name=file_name,
+        mime=mime,
+        key=f"{key}_download",
+        on_click=lambda: st.session_state.pop(state_key, None),
+    )
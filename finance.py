@@ -0,0 +1,256 @@
+# finance.py
+# Calculations behind the pages: summaries, chart aggregates, fund growth and
+# returns. Nothing in here touches Streamlit or the database, so it can be
+# imported and tested without running a page.
+import calendar
+import numpy as np
+import pandas as pd
+
+# Upper bound of points per line sent to Plotly, roughly one per pixel of a wide chart
+MAX_CHART_POINTS = 1000
+
+
+# --- Expenses ---
+
+def month_names():
+    # In the language of the current LC_TIME locale (the app sets it, see
+    # formatting.set_locale)
+    return list(calendar.month_name)[1:]
+
+
+def month_name_categories(months, names=None):
+    # Month labels as a categorical over the 12 names instead of a per-row lookup
+    names = month_names() if names is None else names
+    return pd.Categorical.from_codes(np.asarray(months, dtype=int) - 1, categories=names, ordered=True)
+
+
+def prepare_chart_frame(df):
+    # Derives the compact calendar columns every chart uses from a typed
+    # expense frame (see get_expenses_typed)
+    months = df["date"].dt.month
+    return df.assign(
+        year=df["date"].dt.year.astype("int16"),
+        month=months.astype("int8"),
+        day=df["date"].dt.day.astype("int8"),
+        month_name=month_name_categories(months),
+    )
+
+
+def month_range(start, end):
+    # First day of every month from start to end, both included
+    return pd.date_range(pd.Timestamp(start).replace(day=1), pd.Timestamp(end), freq="MS")
+
+
+def month_numbers(dates):
+    dates = pd.DatetimeIndex(dates)
+    return dates.year * 12 + dates.month - 1
+
+
+def schedule_anchors(history):
+    # Start of the run every history row belongs to: the valid_from of the
+    # item's first row, or of its first row after an end marker. Changing the
+    # amount or day keeps the anchor, so the item stays due in the same months.
+    history = history.sort_values(["name", "valid_from"])
+    run = history["amount"].isna().astype(int).groupby(history["name"]).cumsum()
+    starts = history["valid_from"].where(history["amount"].notna())
+    return history.assign(anchor=starts.groupby([history["name"], run]).transform("min"))
+
+
+def resolve_fixed_items(history, months):
+    # Row of every fixed item in force on the first day of every month, found
+    # with one as-of join over the (month x item) grid. An item recurs every
+    # interval_months months, counted from the first month of its run (see
+    # schedule_anchors); `due` marks the months with a posting.
+    names = history["name"].unique()
+    grid = pd.DataFrame({
+        "month": np.repeat(months.to_numpy(), len(names)),
+        "name": np.tile(names, len(months)),
+    })
+    resolved = pd.merge_asof(grid, schedule_anchors(history).sort_values("valid_from"),
+                             left_on="month", right_on="valid_from", by="name")
+    first_month = resolved["anchor"] + pd.offsets.MonthBegin(0)
+    elapsed = month_numbers(resolved["month"]) - month_numbers(first_month)
+    interval = resolved["interval_months"].fillna(1).clip(lower=1).to_numpy()
+    resolved["due"] = resolved["amount"].notna().to_numpy() & (elapsed.to_numpy() % interval == 0)
+    return resolved
+
+
+def amounts_in_force(history, months):
+    # Total of the fixed items due in every month; items not started yet,
+    # ended or not due in a month count as 0
+    if history.empty or len(months) == 0:
+        return pd.Series(0.0, index=months)
+    resolved = resolve_fixed_items(history, months)
+    due = resolved["amount"].where(resolved["due"], 0.0)
+    return due.groupby(resolved["month"]).sum().reindex(months, fill_value=0.0)
+
+
+def iter_postings(history, start, end, chunk_months=120):
+    # Lazily yields the postings of the fixed items between start and end
+    # (both included) as frames of date/name/amount, one per chunk of months
+    # (ten years by default, so decades are never expanded at once).
+    # A posting falls on the item's day of the month, or the month's last day.
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    months = month_range(start, end)
+    if history.empty:
+        return
+    for offset in range(0, len(months), chunk_months):
+        resolved = resolve_fixed_items(history, months[offset:offset + chunk_months])
+        resolved = resolved[resolved["due"]]
+        month = pd.DatetimeIndex(resolved["month"])
+        day = np.minimum(resolved["day"].fillna(1).to_numpy(dtype=int), month.days_in_month)
+        dates = month + pd.to_timedelta(day - 1, unit="D")
+        inside = (dates >= start) & (dates <= end)
+        yield pd.DataFrame({
+            "date": dates[inside],
+            "name": resolved["name"].to_numpy()[inside],
+            "amount": resolved["amount"].to_numpy()[inside],
+        }).sort_values(["date", "name"], ignore_index=True)
+
+
+def rollup_month_totals(rollup):
+    # Variable expenses per month start from the monthly rollup
+    totals = rollup.groupby(["year", "month"])["total"].sum()
+    months = pd.to_datetime(pd.DataFrame({
+        "year": totals.index.get_level_values("year"),
+        "month": totals.index.get_level_values("month"),
+        "day": 1,
+    }))
+    return pd.Series(totals.to_numpy(dtype=float), index=pd.DatetimeIndex(months))
+
+
+def monthly_balances(months, variable, fixed_cost_history, income_history):
+    # Income, fixed costs, variable expenses and balance for every month
+    income = amounts_in_force(income_history, months)
+    fixed = amounts_in_force(fixed_cost_history, months)
+    variable = variable.reindex(months, fill_value=0.0)
+    return pd.DataFrame({
+        "income": income,
+        "fixed": fixed,
+        "variable": variable,
+        "balance": income - fixed - variable,
+    }, index=months)
+
+
+def build_summary(name, balances):
+    return pd.DataFrame([{
+        "Zeitraum": name,
+        "Einkommen (€)": balances["income"].sum(),
+        "Fixkosten (€)": balances["fixed"].sum(),
+        "Variable Ausgaben (€)": balances["variable"].sum(),
+        "Saldo (€)": balances["balance"].sum()
+    }])
+
+
+def category_totals(df_month):
+    grouped = df_month.groupby("category", observed=True)["amount_cents"].sum().div(100)
+    return grouped.reset_index(name="amount")
+
+
+def daily_totals(df_month):
+    return df_month.groupby("day")["amount_cents"].sum().div(100).reset_index(name="amount")
+
+
+def monthly_totals(rollup_year):
+    trend = rollup_year.groupby("month", as_index=False)["total"].sum()
+    return trend.rename(columns={"month": "month_num", "total": "amount"})
+
+
+def month_category_totals(rollup_year):
+    grouped = rollup_year.rename(columns={'month': 'month_num', 'total': 'amount'})
+    grouped['month_name'] = month_name_categories(grouped['month_num'])
+    grouped['year'] = grouped['year'].astype(str)
+    return grouped.sort_values('month_num')
+
+
+def dashboard_kpis(month_balance, fund_snapshot):
+    return {
+        "income": month_balance["income"].sum(),
+        "expenses": month_balance["fixed"].sum() + month_balance["variable"].sum(),
+        "funds": fund_snapshot["actual_value"].sum(),
+    }
+
+
+# --- Funds ---
+
+def fund_growth(df):
+    # Change of the fund value over the given rows; None with fewer than two
+    if len(df) < 2:
+        return None
+
+    df_sorted = df.sort_values("last_updated")
+    first = df_sorted["actual_value"].iloc[0]
+    last = df_sorted["actual_value"].iloc[-1]
+    if first == 0:
+        percent = np.inf if last > 0 else 0.0
+    else:
+        percent = (last - first) / first * 100
+    return {"first": first, "last": last, "percent": percent}
+
+
+def fund_returns(df):
+    # Profit/loss of the latest value against everything paid in up to then
+    # (cumulative_contribution is maintained by the database)
+    invested = df["cumulative_contribution"].iloc[-1]
+    current = df["actual_value"].iloc[-1]
+    profit = current - invested
+    percent = profit / invested * 100 if invested > 0 else 0
+    return {"invested": invested, "current": current, "profit": profit, "percent": percent}
+
+
+def fund_window(df, months=None, today=None):
+    # Rows of the last `months` months (all rows for None). df must be sorted
+    # by last_updated, so the window start is found by binary search.
+    if months is None:
+        return df
+    start = pd.Timestamp(today or pd.Timestamp.today().date()) - pd.DateOffset(months=months)
+    dates = df["last_updated"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        start = start.date()
+    return df.iloc[dates.searchsorted(start):]
+
+
+# --- Charts ---
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and from
+    # every bucket in between the point spanning the largest triangle with the
+    # previously kept point and the average of the next bucket
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    edges = np.append(edges, n)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        avg_x = x[end:edges[i + 2]].mean()
+        avg_y = y[end:edges[i + 2]].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def downsample(df, x, y, max_points=MAX_CHART_POINTS):
+    # df must be sorted by x; returns at most max_points rows picked by LTTB on y
+    if len(df) <= max_points:
+        return df
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.astype("int64")
+    return df.iloc[lttb_indices(xs.to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def zoom(df, start=None, end=None, column="last_updated"):
+    # Visible range of a sorted series, found by binary search
+    dates = df[column]
+    lo = dates.searchsorted(pd.Timestamp(start)) if start is not None else 0
+    hi = dates.searchsorted(pd.Timestamp(end), side="right") if end is not None else len(df)
+    return df.iloc[lo:hi]
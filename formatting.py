@@ -1,5 +1,20 @@
+import locale
 import streamlit as st
 
+_locale_set = False
+
+def set_locale():
+    # German month names; setlocale affects the whole process, so it runs
+    # once at startup instead of on every rerun
+    global _locale_set
+    if _locale_set:
+        return
+    try:
+        locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
+    except locale.Error:
+        locale.setlocale(locale.LC_TIME, '')  # fallback to system locale
+    _locale_set = True
+
 def hide_menu():
     st.markdown(""" <style>
     #MainMenu {visibility: hidden;}
@@ -0,0 +1,232 @@
+# importer.py
+# Imports bank statements (CSV or CAMT.053 XML) into the expenses table.
+#
+#   python importer.py kontoauszug.csv
+#   python importer.py auszug.xml --db expenses.db --category Sonstiges
+#
+# Files are read in chunks so memory stays bounded for very long statements,
+# and every row gets an import_hash so importing the same file twice adds
+# nothing the second time.
+import argparse
+import hashlib
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from db import DB_NAME, connect, init_db, import_expenses_bulk
+
+CHUNK_SIZE = 50_000
+DEFAULT_CATEGORY = "Sonstiges"
+
+# Column names used by common German bank exports, tried in this order
+COLUMN_CANDIDATES = {
+    "date": ["Buchungstag", "Buchungsdatum", "Datum", "Valutadatum", "date"],
+    "description": ["Verwendungszweck", "Buchungstext", "Beschreibung", "Beguenstigter/Zahlungspflichtiger", "description"],
+    "amount": ["Betrag", "Umsatz", "Betrag (EUR)", "amount"],
+    "category": ["Kategorie", "category"],
+}
+
+
+def _find_column(columns, field, override=None):
+    if override:
+        if override not in columns:
+            raise ValueError(f"Column '{override}' not found in statement")
+        return override
+    for candidate in COLUMN_CANDIDATES[field]:
+        if candidate in columns:
+            return candidate
+    if field == "category":
+        return None
+    raise ValueError(f"No column for '{field}' found, expected one of {COLUMN_CANDIDATES[field]}")
+
+
+def read_csv_chunks(source, chunksize=CHUNK_SIZE, sep=";", decimal=",", thousands=".",
+                    encoding="utf-8", column_map=None):
+    column_map = column_map or {}
+    # Everything is read as text; amounts are parsed below so that both
+    # German and English number formats work with the same reader
+    reader = pd.read_csv(source, sep=sep, encoding=encoding, chunksize=chunksize, dtype=str, keep_default_na=False)
+    mapping = None
+    for chunk in reader:
+        if mapping is None:
+            mapping = {field: _find_column(chunk.columns, field, column_map.get(field)) for field in COLUMN_CANDIDATES}
+        amounts = chunk[mapping["amount"]].str.replace(thousands, "", regex=False).str.replace(decimal, ".", regex=False)
+        yield pd.DataFrame({
+            "date": pd.to_datetime(chunk[mapping["date"]], dayfirst=True, errors="coerce"),
+            "description": chunk[mapping["description"]],
+            "category": chunk[mapping["category"]] if mapping["category"] else "",
+            "amount": pd.to_numeric(amounts, errors="coerce"),
+        })
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(elem, *path):
+    for name in path:
+        if elem is None:
+            return None
+        elem = next((child for child in elem if _local(child.tag) == name), None)
+    return elem
+
+
+def _camt_entry(entry):
+    amount = float(_child(entry, "Amt").text)
+    if (_child(entry, "CdtDbtInd").text or "").strip() == "DBIT":
+        amount = -amount
+
+    booked = None
+    for path in [("BookgDt", "Dt"), ("BookgDt", "DtTm"), ("ValDt", "Dt")]:
+        booked = _child(entry, *path)
+        if booked is not None:
+            break
+    remittance = [elem.text for elem in entry.iter() if _local(elem.tag) == "Ustrd" and elem.text]
+    info = _child(entry, "AddtlNtryInf")
+    description = " ".join(remittance) or (info.text if info is not None else "")
+    return booked.text[:10] if booked is not None else None, description, amount
+
+
+def read_camt_chunks(source, chunksize=CHUNK_SIZE):
+    # iterparse keeps only the current <Ntry> in memory; processed entries are
+    # removed from their parent, so the tree does not grow with the file
+    rows = []
+    open_elements = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            open_elements.append(elem)
+            continue
+        open_elements.pop()
+        if _local(elem.tag) != "Ntry":
+            continue
+        rows.append(_camt_entry(elem))
+        if open_elements:
+            open_elements[-1].remove(elem)
+        if len(rows) >= chunksize:
+            yield _camt_frame(rows)
+            rows = []
+    if rows:
+        yield _camt_frame(rows)
+
+
+def _camt_frame(rows):
+    df = pd.DataFrame(rows, columns=["date", "description", "amount"])
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["category"] = ""
+    return df
+
+
+def _hash64(values):
+    return [int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest()[:8], "big", signed=True) for value in values]
+
+
+class OccurrenceCounter:
+    # Counts how often each (date, description, amount) key was seen across
+    # chunks, so two identical purchases on the same day get distinct hashes.
+    # Keys are stored as sorted int64 arrays (16 bytes per distinct key).
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def occurrences(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        within_chunk = pd.Series(keys).groupby(keys).cumcount().to_numpy()
+
+        previous = np.zeros(len(keys), dtype=np.int64)
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            found = self.keys[pos] == keys
+            previous[found] = self.counts[pos[found]]
+
+        chunk_keys, chunk_counts = np.unique(keys, return_counts=True)
+        all_keys = np.concatenate([self.keys, chunk_keys])
+        all_counts = np.concatenate([self.counts, chunk_counts])
+        self.keys, inverse = np.unique(all_keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=all_counts).astype(np.int64)
+
+        return previous + within_chunk
+
+
+def prepare_chunk(chunk, counter, default_category=DEFAULT_CATEGORY, debits_positive=False):
+    chunk = chunk.dropna(subset=["date", "amount"])
+    # Only outgoing payments are expenses
+    chunk = chunk[chunk["amount"] > 0] if debits_positive else chunk[chunk["amount"] < 0]
+
+    dates = chunk["date"].dt.strftime("%Y-%m-%d")
+    descriptions = chunk["description"].fillna("").astype(str).str.strip()
+    amounts = chunk["amount"].abs().round(2)
+    categories = chunk["category"].fillna("").astype(str).str.strip().replace("", default_category)
+
+    base = [f"{d}|{desc}|{amount:.2f}" for d, desc, amount in zip(dates, descriptions, amounts)]
+    occurrences = counter.occurrences(_hash64(base))
+
+    return pd.DataFrame({
+        "date": dates.to_numpy(),
+        "description": descriptions.to_numpy(),
+        "category": categories.to_numpy(),
+        "amount": amounts.to_numpy(),
+        "import_hash": _hash64(f"{key}|{occ}" for key, occ in zip(base, occurrences)),
+    })
+
+
+def _detect_format(name):
+    return "camt" if str(name).lower().endswith(".xml") else "csv"
+
+
+def import_statement(conn, source, fmt=None, chunksize=CHUNK_SIZE, default_category=DEFAULT_CATEGORY,
+                     debits_positive=False, progress=None, **csv_options):
+    fmt = fmt or _detect_format(getattr(source, "name", source))
+    if fmt == "camt":
+        chunks = read_camt_chunks(source, chunksize=chunksize)
+    else:
+        chunks = read_csv_chunks(source, chunksize=chunksize, **csv_options)
+
+    counter = OccurrenceCounter()
+    inserted = skipped = 0
+    for chunk in chunks:
+        rows = prepare_chunk(chunk, counter, default_category, debits_positive)
+        added = import_expenses_bulk(conn, rows)
+        inserted += added
+        skipped += len(rows) - added
+        if progress:
+            progress(inserted, skipped)
+    return inserted, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kontoauszug (CSV oder CAMT.053) in die Ausgaben importieren")
+    parser.add_argument("file")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--format", choices=["csv", "camt"])
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--category", default=DEFAULT_CATEGORY, help="Kategorie für Zeilen ohne Kategorie")
+    parser.add_argument("--debits-positive", action="store_true", help="Ausgaben stehen als positive Beträge im Auszug")
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--decimal", default=",")
+    parser.add_argument("--thousands", default=".")
+    parser.add_argument("--encoding", default="utf-8")
+    for field in COLUMN_CANDIDATES:
+        parser.add_argument(f"--{field}-col", dest=f"{field}_col")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    init_db(conn)
+    csv_options = {}
+    if (args.format or _detect_format(args.file)) == "csv":
+        csv_options = dict(
+            sep=args.sep, decimal=args.decimal, thousands=args.thousands, encoding=args.encoding,
+            column_map={field: getattr(args, f"{field}_col") for field in COLUMN_CANDIDATES},
+        )
+
+    inserted, skipped = import_statement(
+        conn, args.file, fmt=args.format, chunksize=args.chunksize, default_category=args.category,
+        debits_positive=args.debits_positive,
+        progress=lambda i, s: print(f"\r{i} importiert, {s} bereits vorhanden", end="", flush=True),
+        **csv_options,
+    )
+    print(f"\r{inserted} importiert, {skipped} bereits vorhanden")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# instrumentation.py
+# Per-rerun timing of database calls, page functions and Plotly figures.
+#
+# Collection is active when the app runs with FINANZ_PROFILE=1 or the URL
+# contains ?debug=1. Each profiled rerun is appended to a JSON-lines log
+# (FINANZ_PROFILE_LOG, default perf.jsonl) and shown in a sidebar panel.
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+LOG_PATH = os.environ.get("FINANZ_PROFILE_LOG", "perf.jsonl")
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+class RunStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.page = None
+        self.queries = 0
+        self.totals = defaultdict(float)  # kind -> ms, outermost spans only
+        self.functions = defaultdict(lambda: {"kind": "", "calls": 0, "ms": 0.0, "rows": 0})
+        self.depth = defaultdict(int)
+
+    def count_query(self, statement):
+        if not statement.lstrip().upper().startswith(("BEGIN", "COMMIT", "PRAGMA")):
+            self.queries += 1
+
+    def record(self, kind, name, ms, rows, outermost):
+        entry = self.functions[name]
+        entry["kind"] = kind
+        entry["calls"] += 1
+        entry["ms"] += ms
+        entry["rows"] += rows
+        if outermost:
+            self.totals[kind] += ms
+
+    def summary(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        page_ms = self.totals["page"]
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "page": self.page,
+            "total_ms": round(total_ms, 2),
+            "queries": self.queries,
+            "rows": sum(entry["rows"] for entry in self.functions.values() if entry["kind"] == "sql"),
+            "sql_ms": round(self.totals["sql"], 2),
+            "plotly_ms": round(self.totals["plotly"], 2),
+            # Page time that was neither spent in SQL nor in Plotly
+            "pandas_ms": round(max(page_ms - self.totals["sql"] - self.totals["plotly"], 0), 2),
+            "functions": {name: {**entry, "ms": round(entry["ms"], 2)} for name, entry in self.functions.items()},
+        }
+
+
+def current():
+    return getattr(_local, "stats", None)
+
+
+def _rows(result):
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    return 0
+
+
+def _timed_iteration(stats, kind, label, items):
+    # Only the time spent producing each item counts, not the time the
+    # caller spends between items
+    ms, rows, outermost = 0.0, 0, stats.depth[kind] == 0
+    try:
+        while True:
+            stats.depth[kind] += 1
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                stats.depth[kind] -= 1
+                ms += (time.perf_counter() - start) * 1000
+            rows += _rows(item)
+            yield item
+    finally:
+        items.close()
+        stats.record(kind, label, ms, rows, outermost)
+
+
+def timed(kind, name=None):
+    def decorator(func):
+        label = name or func.__qualname__
+
+        if inspect.isgeneratorfunction(func):
+            # Calling a generator function runs none of its body, so the
+            # iteration is timed instead of the call
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                stats = current()
+                items = func(*args, **kwargs)
+                if stats is None:
+                    return items
+                return _timed_iteration(stats, kind, label, items)
+
+            wrapper.__instrumented__ = True
+            return wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            stats = current()
+            if stats is None:
+                return func(*args, **kwargs)
+
+            # Nested spans of the same kind (db functions calling each other)
+            # only count once towards the totals
+            outermost = stats.depth[kind] == 0
+            stats.depth[kind] += 1
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                stats.depth[kind] -= 1
+                stats.record(kind, label, (time.perf_counter() - start) * 1000, _rows(result), outermost)
+
+        wrapper.__instrumented__ = True
+        return wrapper
+    return decorator
+
+
+def page_timer(func):
+    return timed("page")(func)
+
+
+def instrument_module(module, kind="sql"):
+    # Wraps every public function of the module that takes a connection
+    for name, func in list(vars(module).items()):
+        if name.startswith("_") or not inspect.isfunction(func) or getattr(func, "__instrumented__", False):
+            continue
+        if func.__module__ != module.__name__:
+            continue
+        params = list(inspect.signature(func).parameters)
+        if params and params[0] == "conn":
+            setattr(module, name, timed(kind, f"{module.__name__}.{name}")(func))
+
+
+def instrument_plotly():
+    for name in ("bar", "line", "scatter"):
+        if not getattr(getattr(px, name), "__instrumented__", False):
+            setattr(px, name, timed("plotly", f"px.{name}")(getattr(px, name)))
+    for name in ("add_trace", "update_layout"):
+        method = getattr(go.Figure, name)
+        if not getattr(method, "__instrumented__", False):
+            setattr(go.Figure, name, timed("plotly", f"Figure.{name}")(method))
+    # Figure serialization happens inside st.plotly_chart
+    if not getattr(st.plotly_chart, "__instrumented__", False):
+        st.plotly_chart = timed("plotly", "st.plotly_chart")(st.plotly_chart)
+
+
+def enabled():
+    return os.environ.get("FINANZ_PROFILE") == "1" or st.query_params.get("debug") == "1"
+
+
+def begin_run(conn):
+    if not enabled():
+        _local.stats = None
+        return
+    stats = RunStats()
+    _local.stats = stats
+    _local.conn = conn
+    conn.set_trace_callback(stats.count_query)
+
+
+def end_run(page=None, show_panel=True):
+    stats = current()
+    if stats is None:
+        return
+    _local.stats = None
+    _local.conn.set_trace_callback(None)
+    stats.page = page
+
+    summary = stats.summary()
+    with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(summary) + "\n")
+    if show_panel:
+        debug_panel(summary)
+
+
+def debug_panel(summary):
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        col1, col2 = st.columns(2)
+        col1.metric("Gesamt", f"{summary['total_ms']:.0f} ms")
+        col2.metric("Abfragen", summary["queries"])
+        col1.metric("SQL", f"{summary['sql_ms']:.0f} ms")
+        col2.metric("Plotly", f"{summary['plotly_ms']:.0f} ms")
+        col1.metric("Pandas & Rest", f"{summary['pandas_ms']:.0f} ms")
+        col2.metric("Zeilen", summary["rows"])
+
+        functions = pd.DataFrame.from_dict(summary["functions"], orient="index")
+        if not functions.empty:
+            st.dataframe(functions.sort_values("ms", ascending=False), use_container_width=True)
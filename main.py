@@ -1,15 +1,20 @@
 # main.py
 import streamlit as st
 from streamlit import Page, navigation
-from formatting import hide_menu
-from db import get_connection, init_db
+from formatting import hide_menu, set_locale
+import db
+import instrumentation
 
 st.set_page_config("Finanzheini", layout="wide")  # Must be first
+set_locale()
+
+# Wrappers only record while profiling is enabled (FINANZ_PROFILE=1 or ?debug=1)
+instrumentation.instrument_module(db)
+instrumentation.instrument_plotly()
 
 def main():
+    instrumentation.begin_run(db.get_connection())
     hide_menu()
-    conn = get_connection()
-    init_db(conn)
 
     # Define pages
     intro = Page('pages/dashboard.py', title='Dashboard', icon='📈')
@@ -20,7 +25,10 @@ def main():
 
     # Run navigation
     nav = navigation([intro, fixed, vary, charts, fonds])
-    nav.run()
+    try:
+        nav.run()
+    finally:
+        instrumentation.end_run(page=nav.title)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,32 +1,43 @@
-import locale
 import calendar
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import date, datetime
 from db import *
+from finance import (
+    prepare_chart_frame, build_summary, category_totals, daily_totals, monthly_totals, month_category_totals,
+    month_range, monthly_balances, rollup_month_totals,
+)
+from formatting import set_locale
+from instrumentation import page_timer
+from export import expense_report_csv, expenses_parquet, lazy_download_button
 
 # TODO Monatsbericht anzeigen lassen und optional exportieren + Tägliche ausgaben raus, nur Jahr und Monat und Fixkosten integrieren, dann Legende mit grouped bar chart
 
-# Set locale to get month names in German
-try:
-    locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
-except locale.Error:
-    locale.setlocale(locale.LC_TIME, '')  # fallback to system locale
 
-def financial_summary_export(df, fixed_cost_df, income_dict):
-    st.subheader("📊 Finanzübersicht")
+def year_balances(conn, year, rollup_year):
+    # Fixed costs and incomes as they were in force in every month of the year
+    months = month_range(date(year, 1, 1), date(year, 12, 31))
+    return monthly_balances(
+        months, rollup_month_totals(rollup_year), get_fixed_cost_history(conn), get_fixed_income_history(conn)
+    )
 
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month
 
-    years = sorted(df['year'].unique(), reverse=True)
+@page_timer
+def financial_summary_export(conn):
+    st.subheader("📊 Finanzübersicht")
+
+    years = get_expense_years(conn)
     selected_year = st.selectbox("📆 Jahr auswählen", years, index=0, key="summary_year_select")
 
+    # Totals come from the monthly rollup; raw rows are only loaded for the selected month
+    if selected_year is not None:
+        rollup_year = get_monthly_rollup(conn, selected_year)
+    else:
+        rollup_year = get_monthly_rollup(conn).iloc[0:0]
+
     default_month = datetime.today().month
-    months = sorted(df[df['year'] == selected_year]['month'].unique())
+    months = sorted(rollup_year['month'].unique())
     if default_month in months:
         default_index = months.index(default_month)
     else:
@@ -34,70 +45,67 @@ def financial_summary_export(df, fixed_cost_df, income_dict):
 
     selected_month = st.selectbox("📅 Monat auswählen", months, index=default_index,key="summary_month_select")
 
-    df_month = df[(df['year'] == selected_year) & (df['month'] == selected_month)]
-    df_year = df[df['year'] == selected_year]
-
-    def build_summary(name, sub_df):
-        total_expenses = sub_df["amount"].sum()
-        total_fixed = fixed_cost_df["amount"].sum() if not fixed_cost_df.empty else 0
-        total_income = income_dict.get("fixed", 0) + income_dict.get("variable", 0)
-        balance = total_income - total_fixed - total_expenses
-
-        return pd.DataFrame([{
-            "Zeitraum": name,
-            "Einkommen (€)": total_income,
-            "Fixkosten (€)": total_fixed,
-            "Variable Ausgaben (€)": total_expenses,
-            "Saldo (€)": balance
-        }])
-
-    def export_report(name, sub_df):
-        summary = build_summary(name, sub_df)
-        spacer = pd.DataFrame({col: [""] for col in summary.columns})
-        details = sub_df[["date", "description", "category", "amount"]].rename(columns={
-            "date": "Datum", "description": "Beschreibung", "category": "Kategorie", "amount": "Betrag (€)"
-        })
-
-        all_rows = pd.concat([summary, spacer, details])
-        return all_rows.to_csv(index=False).encode("utf-8")
+    if selected_month is not None:
+        month_start = date(selected_year, selected_month, 1)
+        month_end = date(selected_year, selected_month, calendar.monthrange(selected_year, selected_month)[1])
+        df_month = get_expenses_typed(conn, month_start, month_end)
+    else:
+        df_month = get_expenses_typed(conn, date.today(), date.today()).iloc[0:0]
+    df_month = prepare_chart_frame(df_month)
+
+    year = selected_year or date.today().year
+    balances = year_balances(conn, year, rollup_year)
+    month_balance = balances.loc[[pd.Timestamp(year, selected_month or date.today().month, 1)]]
+
+    # Reports are only generated when requested, streaming rows from the database
     st.markdown("<br>", unsafe_allow_html=True)
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
 
     with col1:
         if len(df_month) > 0:
-            csv_month = export_report(f"{calendar.month_name[selected_month]} {selected_year}", df_month)
-            st.download_button(
-                label="📥 Monatsbericht exportieren",
-                data=csv_month,
+            month_summary = build_summary(f"{calendar.month_name[selected_month]} {selected_year}", month_balance)
+            lazy_download_button(
+                "📄 Monatsbericht erstellen", "📥 Monatsbericht exportieren",
+                lambda: expense_report_csv(conn, month_start, month_end, month_summary),
                 file_name=f"monatsbericht_{selected_year}_{selected_month}.csv",
-                mime="text/csv"
+                mime="text/csv",
+                key="month_report",
+                version=data_version(conn, "expenses", "fixed_cost_history", "fixed_income_history"),
             )
         else:
             st.info("Keine Ausgaben im ausgewählten Monat.")
 
     with col2:
-        if len(df_year) > 0:
-            csv_year = export_report(str(selected_year), df_year)
-            st.download_button(
-                label="📥 Jahresbericht exportieren",
-                data=csv_year,
+        if len(rollup_year) > 0:
+            year_summary = build_summary(str(selected_year), balances)
+            lazy_download_button(
+                "📄 Jahresbericht erstellen", "📥 Jahresbericht exportieren",
+                lambda: expense_report_csv(conn, date(selected_year, 1, 1), date(selected_year, 12, 31), year_summary),
                 file_name=f"jahresbericht_{selected_year}.csv",
-                mime="text/csv"
+                mime="text/csv",
+                key="year_report",
+                version=data_version(conn, "expenses", "fixed_cost_history", "fixed_income_history"),
             )
         else:
             st.info("Keine Ausgaben im ausgewählten Jahr.")
 
-    return df_month, df_year
+    with col3:
+        if years:
+            first_year, last_year = min(years), max(years)
+            lazy_download_button(
+                "🗄️ Gesamtexport erstellen", "📥 Alle Ausgaben (Parquet)",
+                lambda: expenses_parquet(conn, date(first_year, 1, 1), date(last_year, 12, 31)),
+                file_name=f"ausgaben_{first_year}_{last_year}.parquet",
+                mime="application/octet-stream",
+                key="all_expenses_parquet",
+                version=data_version(conn, "expenses"),
+            )
 
+    return df_month, rollup_year, month_balance
 
-def bar_chart_grouped_by_month_category(df_year):
-    df_year = df_year.copy()
-    df_year['month_num'] = df_year['date'].dt.month
-    df_year['month_name'] = df_year['month_num'].apply(lambda x: calendar.month_name[x])
-    df_year['year'] = df_year['date'].dt.year.astype(str)
 
-    grouped = df_year.groupby(['year', 'month_num', 'month_name', 'category'], as_index=False)['amount'].sum()
-    grouped = grouped.sort_values('month_num')
+def bar_chart_grouped_by_month_category(rollup_year):
+    grouped = month_category_totals(rollup_year)
 
     fig = px.bar(
         grouped,
@@ -120,17 +128,16 @@ def bar_chart_grouped_by_month_category(df_year):
     return fig
 
 
-def spending_charts_tabs(df_month, df_year):
+@page_timer
+def spending_charts_tabs(df_month, rollup_year):
     tab1, tab2 = st.tabs(["📅 Monat", "📆 Jahr"])
 
     with tab1:
         if not df_month.empty:
-            df_month = df_month.copy()
-            df_month["month_label"] = df_month["date"].dt.strftime("%B %Y")
-            month_label = df_month["month_label"].iloc[0]
+            month_label = f"{df_month['month_name'].iloc[0]} {df_month['year'].iloc[0]}"
 
             # Group by category for the single selected month
-            grouped_month = df_month.groupby("category")["amount"].sum().reset_index()
+            grouped_month = category_totals(df_month)
 
             fig_grouped_month = px.bar(
                 grouped_month,
@@ -144,8 +151,7 @@ def spending_charts_tabs(df_month, df_year):
             st.plotly_chart(fig_grouped_month, use_container_width=True)
 
             # Line chart by day
-            df_month['day'] = df_month['date'].dt.day
-            trend_month = df_month.groupby("day")["amount"].sum().reset_index()
+            trend_month = daily_totals(df_month)
 
             fig_line_month = px.line(
                 trend_month,
@@ -169,17 +175,12 @@ def spending_charts_tabs(df_month, df_year):
             st.info("Keine Ausgaben im aktuellen Monat.")
 
     with tab2:
-        if not df_year.empty:
-            df_year = df_year.copy()
-            df_year['month_num'] = df_year['date'].dt.month
-            df_year['month_name'] = df_year['month_num'].apply(lambda x: calendar.month_name[x])
-            df_year['year'] = df_year['date'].dt.year.astype(str)
-
-            fig_bar = bar_chart_grouped_by_month_category(df_year)
+        if not rollup_year.empty:
+            fig_bar = bar_chart_grouped_by_month_category(rollup_year)
             st.plotly_chart(fig_bar, use_container_width=True)
 
             # Line chart by month number
-            trend_year = df_year.groupby("month_num")["amount"].sum().reset_index()
+            trend_year = monthly_totals(rollup_year)
             fig_line_year = px.line(
                 trend_year,
                 x="month_num",
@@ -202,14 +203,12 @@ def spending_charts_tabs(df_month, df_year):
             st.info("Keine Ausgaben im aktuellen Jahr.")
 
 
-# Main flow
-conn = get_connection()
-expenses_df = get_expenses(conn)
-fixed_costs_df = get_fixed_costs(conn)
-income_dict = {"fixed": 1800, "variable": 150}  # Replace with your actual logic
-
-df_month, df_year = financial_summary_export(expenses_df, fixed_costs_df, income_dict)
+# Main flow (only when Streamlit runs this page, not when it is imported)
+if __name__ == "__main__":
+    set_locale()  # no-op when started through main.py
+    conn = get_connection()
+    df_month, rollup_year, _ = financial_summary_export(conn)
 
-st.markdown("---")
-st.markdown("<br>", unsafe_allow_html=True)
-spending_charts_tabs(df_month, df_year)
+    st.markdown("---")
+    st.markdown("<br>", unsafe_allow_html=True)
+    spending_charts_tabs(df_month, rollup_year)
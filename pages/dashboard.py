@@ -1,29 +1,35 @@
 import streamlit as st
-from pages.charts import *
-from pages.fonds import *
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from db import *
+from analytics import cached_fund_metrics
+from finance import (
+    MAX_CHART_POINTS, dashboard_kpis, downsample, month_range, monthly_balances, rollup_month_totals, zoom,
+)
+from instrumentation import page_timer
+from pages.charts import financial_summary_export, spending_charts_tabs
+from pages.fonds import chart_mode, show_growth, zoom_slider
+from projection import fund_parameters, project
 
 #TODO Jahres und monatsbericht inklusive Fonds?
 
-# --- Helper functions ---
-def show_growth(df):
-    if len(df) >= 2:
-        first = df["actual_value"].iloc[0]
-        last = df["actual_value"].iloc[-1]
-        percent_change = ((last - first) / first) * 100 if first > 0 else 0
-        delta = f"{percent_change:.2f}%"
-        st.metric("📈 Wachstum", f"{last:.2f} €", delta=delta, label_visibility="hidden")
-    else:
-        st.info("Nicht genügend Daten zur Berechnung des Wachstums.")
+PROJECTION_PATHS = 1000
+BALANCE_HISTORY_MONTHS = 12  # months whose balances drive the savings forecast
 
+# --- Helper functions ---
 def show_fund_chart(df, fund_name):
+    df = zoom_slider(df, key="dashboard_zoom_fund")
+    plotted = downsample(df, "last_updated", "actual_value")
+    mode = chart_mode(df, plotted)
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=df['last_updated'], y=df['actual_value'],
-        mode='lines+markers', name='Aktueller Wert'
+        x=plotted['last_updated'], y=plotted['actual_value'],
+        mode=mode, name='Aktueller Wert'
     ))
     fig.add_trace(go.Scatter(
-        x=df['last_updated'], y=df['fixed_amount'],
-        mode='lines+markers', name='Festbetrag'
+        x=plotted['last_updated'], y=plotted['fixed_amount'],
+        mode=mode, name='Festbetrag'
     ))
     fig.update_layout(
         title=f"Verlauf: {fund_name}",
@@ -34,9 +40,9 @@ def show_fund_chart(df, fund_name):
     )
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_all_funds(conn):
-    names = get_all_fund_names(conn)
-    if not names:
+@page_timer
+def plot_all_funds(histories):
+    if histories.empty:
         st.info("Noch keine Fonds vorhanden.")
         return
 
@@ -44,16 +50,24 @@ def plot_all_funds(conn):
     colors = px.colors.qualitative.Set2
     today = pd.Timestamp.today().date()
 
-    for idx, name in enumerate(names):
-        df = get_fund_history(conn, name)
-        df["last_updated"] = pd.to_datetime(df["last_updated"]).dt.date
+    # Every line is downsampled to at most MAX_CHART_POINTS; the zoom range
+    # is only offered when that actually drops points
+    start = end = None
+    if histories.groupby("name").size().max() > MAX_CHART_POINTS:
+        first, last = histories["last_updated"].min().date(), histories["last_updated"].max().date()
+        start, end = st.slider("🔍 Zeitraum zoomen", first, last, (first, last), format="DD.MM.YYYY",
+                               key="dashboard_zoom_all")
+
+    for idx, (name, df) in enumerate(histories.groupby("name", sort=False)):
         df = df.dropna(subset=["actual_value"])  # NaN filtern
 
         if not df.empty:
+            visible = zoom(df, start, end)
+            plotted = downsample(visible, "last_updated", "actual_value")
             fig.add_trace(go.Scatter(
-                x=df["last_updated"],
-                y=df["actual_value"],
-                mode="lines+markers",
+                x=plotted["last_updated"].dt.date,
+                y=plotted["actual_value"],
+                mode=chart_mode(visible, plotted),
                 name=f"{name} ({df['actual_value'].iloc[-1]:.2f} €)",
                 line=dict(color=colors[idx % len(colors)], width=3),
                 marker=dict(symbol="circle", size=6),
@@ -83,57 +97,121 @@ def plot_all_funds(conn):
 
     st.plotly_chart(fig, use_container_width=True)
 
+def show_portfolio_metrics(histories):
+    metrics = cached_fund_metrics(histories)
+    percent = ["twr", "twr_annual", "xirr", "max_drawdown", "volatility"]
+    metrics[percent] = metrics[percent] * 100
+    st.dataframe(
+        metrics,
+        use_container_width=True,
+        column_config={
+            "name": "Fonds",
+            "entries": "Einträge",
+            "twr": st.column_config.NumberColumn("TWR", format="%.2f %%"),
+            "twr_annual": st.column_config.NumberColumn("TWR p.a.", format="%.2f %%"),
+            "xirr": st.column_config.NumberColumn("XIRR p.a.", format="%.2f %%"),
+            "max_drawdown": st.column_config.NumberColumn("Max. Drawdown", format="%.2f %%"),
+            "volatility": st.column_config.NumberColumn("Volatilität p.a.", format="%.2f %%"),
+        },
+    )
+
+def recent_balances(conn, months=BALANCE_HISTORY_MONTHS):
+    # Balances of the last complete months
+    last = pd.Timestamp.today().normalize().replace(day=1) - pd.offsets.MonthBegin(1)
+    balances = monthly_balances(
+        month_range(last - pd.DateOffset(months=months - 1), last),
+        rollup_month_totals(get_monthly_rollup(conn)),
+        get_fixed_cost_history(conn),
+        get_fixed_income_history(conn),
+    )
+    return balances["balance"]
+
+def forecast_chart(bands, title):
+    # Outer band, inner band and median of the percentile columns
+    outer, inner, median = (bands.columns[0], bands.columns[-1]), (bands.columns[1], bands.columns[-2]), bands.columns[2]
+    fig = go.Figure()
+    for (low, high), color in [(outer, "rgba(102, 194, 165, 0.2)"), (inner, "rgba(102, 194, 165, 0.4)")]:
+        fig.add_trace(go.Scatter(x=bands.index, y=bands[high], mode="lines", line=dict(width=0),
+                                 showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=bands.index, y=bands[low], mode="lines", line=dict(width=0),
+                                 fill="tonexty", fillcolor=color, name=f"{low}.–{high}. Perzentil"))
+    fig.add_trace(go.Scatter(x=bands.index, y=bands[median], mode="lines", line=dict(color="rgb(27, 120, 94)", width=3),
+                             name="Median"))
+    fig.update_layout(
+        title=title,
+        yaxis_title="Betrag (€)",
+        xaxis=dict(tickformat="%Y"),
+        template="plotly_white",
+        hovermode="x unified"
+    )
+    return fig
+
+@page_timer
+def show_forecast(conn, histories):
+    years = st.slider("Zeitraum (Jahre)", 1, 30, 10, key="forecast_years")
+    # Fixed seed, so the bands stay put between reruns
+    forecast = project(fund_parameters(histories), recent_balances(conn),
+                       months=years * 12, paths=PROJECTION_PATHS, seed=0)
+
+    tab1, tab2 = st.tabs(["💰 Fondsvermögen", "🏦 Ersparnis"])
+    with tab1:
+        st.plotly_chart(forecast_chart(forecast["funds"], "Prognose Fondsvermögen"), use_container_width=True)
+    with tab2:
+        st.plotly_chart(forecast_chart(forecast["savings"], "Prognose Ersparnis aus dem Monatssaldo"),
+                        use_container_width=True)
+    st.caption(f"{PROJECTION_PATHS} simulierte Verläufe auf Basis der bisherigen Renditen und Monatssalden.")
+
 # --- Dashboard App ---
 
+@page_timer
 def financial_dashboard():
 
     conn = get_connection()
-    expenses_df = get_expenses(conn)
-    fixed_costs_df = get_fixed_costs(conn)
-    income_dict = {"fixed": 1800, "variable": 150}  # Replace with real logic
-
-    df_month, df_year = financial_summary_export(expenses_df, fixed_costs_df, income_dict)
+    df_month, rollup_year, month_balance = financial_summary_export(conn)
 
     # --- KPIs ---
 
-    total_income = income_dict.get("fixed", 0) + income_dict.get("variable", 0)
-    total_fixed = fixed_costs_df["amount"].sum()
-    total_variable = df_month["amount"].sum()
-    total_funds = 0
-    for name in get_all_fund_names(conn):
-        hist = get_fund_history(conn, name)
-        if not hist.empty:
-            total_funds += hist["actual_value"].iloc[-1]
+    fund_snapshot = get_latest_fund_snapshot(conn)
+    kpis = dashboard_kpis(month_balance, fund_snapshot)
     st.markdown("<br>", unsafe_allow_html=True)
     col1, col2, col3 = st.columns(3)
-    col1.metric("💵 Monatliches Einkommen", f"{total_income:.2f} €")
-    col2.metric("💸 Monatliche Ausgaben (Fix + Variabel)", f"{(total_fixed + total_variable):.2f} €")
-    col3.metric("💰 Fondsvermögen (aktuell)", f"{total_funds:.2f} €")
+    col1.metric("💵 Monatliches Einkommen", f"{kpis['income']:.2f} €")
+    col2.metric("💸 Monatliche Ausgaben (Fix + Variabel)", f"{kpis['expenses']:.2f} €")
+    col3.metric("💰 Fondsvermögen (aktuell)", f"{kpis['funds']:.2f} €")
 
     st.divider()
 
     # --- Charts ---
     st.markdown("## 🔍 Ausgabenanalyse")
-    spending_charts_tabs(df_month, df_year)
+    spending_charts_tabs(df_month, rollup_year)
 
     st.divider()
 
     # --- Fondsanalyse ---
     st.markdown("## 📈 Fondsentwicklung")
-    all_funds = get_all_fund_names(conn)
+    all_funds = fund_snapshot["name"].tolist()
     if all_funds:
         selected_fund = st.selectbox("Fonds auswählen", all_funds)
-        df_fund = get_fund_history(conn, selected_fund)
-        df_fund["last_updated"] = pd.to_datetime(df_fund["last_updated"])
+        fund_histories = get_all_fund_histories(conn)
+        df_fund = fund_histories[fund_histories["name"] == selected_fund]
 
-        show_growth(df_fund)
+        show_growth(df_fund, label_visibility="hidden")
         show_fund_chart(df_fund, selected_fund)
 
-        plot_all_funds(conn)
+        plot_all_funds(fund_histories)
+
+        st.markdown("### 📐 Kennzahlen aller Fonds")
+        show_portfolio_metrics(fund_histories)
 
     else:
         st.info("Noch keine Fondsdaten vorhanden.")
 
+    st.divider()
+
+    # --- Prognose ---
+    st.markdown("## 🔮 Prognose")
+    show_forecast(conn, get_all_fund_histories(conn))
+
 if __name__ == "__main__":
     financial_dashboard()
 # Plot: combine fixed_costs, variable expenses, fund investments over months
@@ -2,84 +2,161 @@ import time
 import streamlit as st
 import pandas as pd
 from db import *
+from instrumentation import page_timer
+from widgets import edited_rows, editor_key, keyset_pager, mark_saved
 from datetime import date
 
-
-
+# Turnus -> Monate zwischen zwei Buchungen
+SCHEDULES = {
+    "monatlich": 1,
+    "vierteljährlich": 3,
+    "halbjährlich": 6,
+    "jährlich": 12,
+}
+SCHEDULE_LABELS = {months: label for label, months in SCHEDULES.items()}
+
+UPCOMING_DAYS = 90
+
+
+def schedule_inputs(key):
+    col1, col2 = st.columns(2)
+    label = col1.selectbox("🔁 Turnus", list(SCHEDULES), key=f"{key}_schedule")
+    day = col2.number_input("📆 Tag im Monat", min_value=1, max_value=31, value=1, step=1, key=f"{key}_day",
+                            help="Bei kürzeren Monaten wird am letzten Tag gebucht")
+    return SCHEDULES[label], int(day)
+
+
+def fixed_item_table(conn, key, fetch, save):
+    # One page of the current items as an editor; changes take effect from
+    # the current month on (items that start later: from their start),
+    # earlier months keep the old values
+    page = keyset_pager(key, fetch, lambda row: row["name"], FIXED_ITEM_PAGE_SIZE)
+    if page.empty:
+        return False
+
+    table = editor_key(f"{key}_table", len(st.session_state[f"{key}_cursors"]))
+    edited = st.data_editor(
+        page.assign(
+            schedule=[SCHEDULE_LABELS.get(months, list(SCHEDULES)[0]) for months in page["interval_months"]],
+            delete=False,
+        ),
+        key=table,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["name", "valid_from"],
+        column_order=["name", "amount", "schedule", "day", "valid_from", "delete"],
+        column_config={
+            "name": "Name",
+            "amount": st.column_config.NumberColumn("Betrag (€)", min_value=0.0, format="%.2f €", required=True),
+            "schedule": st.column_config.SelectboxColumn("🔁 Turnus", options=list(SCHEDULES), required=True),
+            "day": st.column_config.NumberColumn("📆 Tag", min_value=1, max_value=31, step=1, required=True),
+            "valid_from": st.column_config.DateColumn("📅 Gültig ab", format="DD.MM.YYYY"),
+            "delete": st.column_config.CheckboxColumn("🗑️"),
+        },
+    )
+
+    changed = edited_rows(table, edited)
+    if not changed.empty and st.button(f"💾 Änderungen speichern ({len(changed)})", key=f"{key}_save"):
+        save(conn, changed.assign(
+            amount=changed["amount"].mask(changed["delete"]),
+            interval_months=changed["schedule"].map(SCHEDULES),
+        ))
+        mark_saved(f"{key}_table")
+        st.success("Änderungen gespeichert.")
+        st.rerun()
+    return True
+
+
+@page_timer
 def fixed_costs_editor(conn):
     st.subheader("🧱 Feste Ausgaben hinzufügen")
 
     with st.form("add_fixed_cost"):
         name = st.text_input("Name der Ausgabe")
         amount = st.number_input("Betrag (€)", min_value=0.0, step=0.01, format="%.2f", value=None)
+        valid_from = st.date_input("📅 Gültig ab", value=date.today().replace(day=1), format="DD.MM.YYYY")
+        interval_months, day = schedule_inputs("cost")
         submitted = st.form_submit_button("➕ Hinzufügen")
 
         if submitted:
-            if name:
-                upsert_fixed_cost(conn, name, amount)
+            if name and amount is not None:
+                upsert_fixed_cost(conn, name, amount, valid_from, interval_months, day)
                 st.success(f"'{name}' wurde gespeichert.")
                 st.rerun()
             else:
-                st.warning("Bitte gib einen Namen ein.")
+                st.warning("Bitte gib einen Namen und einen Betrag ein.")
 
-    # Show existing fixed costs with delete buttons
+    # Existing fixed costs, one page at a time; deleting ends a cost from
+    # the current month on, earlier months keep it
     st.markdown("---")
     st.subheader("📋 Vorhandene Fixkosten")
 
-    df = get_fixed_costs(conn)
-    if df.empty:
+    if not fixed_item_table(conn, "fixed_costs", lambda after, limit: get_fixed_costs_page(conn, after, limit),
+                            set_fixed_costs):
         st.info("Noch keine Fixkosten eingetragen.")
-    else:
-        for i, row in df.iterrows():
-            col1, col2, col3, col4 = st.columns([4, 2, 3, 1])
-            col1.write(row["name"])
-            col2.write(f"{row['amount']:.2f} €")
-            col3.write(f"🕒 {row['last_updated']}")
-            if col4.button("🗑️", key=f"delete_{row['name']}"):
-                delete_fixed_cost(conn, row["name"])
-                st.success(f"'{row['name']}' gelöscht.")
-                st.rerun()
 
 
 
 
+@page_timer
 def fixed_income_editor(conn):
     st.subheader("💰 Fixes Einkommen hinzufügen")
 
     with st.form("add_fixed_income"):
         name = st.text_input("Name der Einnahmequelle")
         amount = st.number_input("Betrag (€)", min_value=0.0, step=0.01, format="%.2f", value=None)
+        valid_from = st.date_input("📅 Gültig ab", value=date.today().replace(day=1), format="DD.MM.YYYY",
+                                   key="income_valid_from")
+        interval_months, day = schedule_inputs("income")
         submitted = st.form_submit_button("➕ Hinzufügen")
 
         if submitted:
-            if name:
-                upsert_fixed_income(conn, name, amount)
+            if name and amount is not None:
+                upsert_fixed_income(conn, name, amount, valid_from, interval_months, day)
                 st.success(f"'{name}' wurde gespeichert.")
                 st.rerun()
             else:
-                st.warning("Bitte gib einen Namen ein.")
+                st.warning("Bitte gib einen Namen und einen Betrag ein.")
 
-    # Show existing fixed incomes with delete buttons
+    # Existing fixed incomes, one page at a time
     st.markdown("---")
     st.subheader("📋 Vorhandene feste Einkommen")
 
-    df = get_fixed_incomes(conn)
-    if df.empty:
+    if not fixed_item_table(conn, "fixed_income", lambda after, limit: get_fixed_incomes_page(conn, after, limit),
+                            set_fixed_incomes):
         st.info("Noch keine festen Einkommen eingetragen.")
-    else:
-        for i, row in df.iterrows():
-            col1, col2, col3, col4 = st.columns([4, 2, 3, 1])
-            col1.write(row["name"])
-            col2.write(f"{row['amount']:.2f} €")
-            col3.write(f"🕒 {row['last_updated']}")
-            if col4.button("🗑️", key=f"delete_income_{row['name']}"):
-                delete_fixed_income(conn, row["name"])
-                st.success(f"'{row['name']}' gelöscht.")
-                st.rerun()
-
 
 
 
-conn = get_connection()
-fixed_costs_editor(conn)
-fixed_income_editor(conn)
\ No newline at end of file
+@page_timer
+def upcoming_postings(conn):
+    st.subheader(f"📆 Anstehende Buchungen ({UPCOMING_DAYS} Tage)")
+
+    start = date.today()
+    end = start + pd.Timedelta(days=UPCOMING_DAYS)
+    postings = pd.concat([
+        get_fixed_cost_postings(conn, start, end).assign(amount=lambda df: -df["amount"]),
+        get_fixed_income_postings(conn, start, end),
+    ]).sort_values(["date", "name"])
+
+    if postings.empty:
+        st.info("Keine anstehenden Buchungen.")
+        return
+    st.dataframe(
+        postings,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "date": st.column_config.DateColumn("Datum", format="DD.MM.YYYY"),
+            "name": "Name",
+            "amount": st.column_config.NumberColumn("Betrag (€)", format="%.2f €"),
+        },
+    )
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    fixed_costs_editor(conn)
+    fixed_income_editor(conn)
+    st.markdown("---")
+    upcoming_postings(conn)
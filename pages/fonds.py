@@ -1,57 +1,94 @@
 import time
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from db import *
+from analytics import fund_metrics
+from finance import (
+    MAX_CHART_POINTS, downsample, fund_growth, fund_returns, fund_window, zoom,
+)
+from instrumentation import page_timer
+from export import lazy_download_button
 
 #TODO darstellung mit aufsummierung von eingezahltem betrag 
 
-def show_growth(df):
-    if len(df) < 2:
+# Zeitraum -> Monate (None = alle Daten)
+FUND_WINDOWS = {
+    "🔁 Letzte 6 Monate": 6,
+    "🕛 Letzte 12 Monate": 12,
+    "📅 Letzte 24 Monate": 24,
+    "📖 Alle": None,
+}
+
+def growth_label(percent):
+    return "∞%" if np.isinf(percent) else f"{percent:.2f}%"
+
+
+def show_growth(df, **metric_options):
+    growth = fund_growth(df)
+    if growth is None:
         st.info("Nicht genügend Daten zur Berechnung des Wachstums.")
         return
 
-    df_sorted = df.sort_values("last_updated")
-    first = df_sorted["actual_value"].iloc[0]
-    last = df_sorted["actual_value"].iloc[-1]
+    st.metric("📈 Wachstum", f"{growth['last']:.2f} €", delta=growth_label(growth["percent"]), **metric_options)
 
-    if first == 0:
-        st.metric("📈 Wachstum", f"{last:.2f} €", delta="∞%" if last > 0 else "0%")
-        return
 
-    percent_change = ((last - first) / first) * 100
-    delta = f"{percent_change:.2f}%"
-    st.metric("📈 Wachstum", f"{last:.2f} €", delta=delta)
+def percent_label(value):
+    return "–" if pd.isna(value) else f"{value * 100:.2f}%"
 
 
+def show_performance(df):
+    metrics = fund_metrics(df).iloc[0]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("⏱️ Zeitgewichtete Rendite", percent_label(metrics["twr"]),
+                help="Rendite ohne den Effekt der Einzahlungen (TWR)")
+    col2.metric("💶 Geldgewichtete Rendite p.a.", percent_label(metrics["xirr"]),
+                help="Interner Zinsfuß aller Einzahlungen und des aktuellen Werts (XIRR)")
+    col3.metric("📉 Max. Drawdown", percent_label(metrics["max_drawdown"]))
+    col4.metric("〰️ Volatilität p.a.", percent_label(metrics["volatility"]),
+                help="Schwankung der Renditen der letzten 12 Einträge")
 
-def show_fund_chart(df, fund_name, key_suffix=""):
-    df = df.copy()
-    df["last_updated"] = pd.to_datetime(df["last_updated"])
-    df["cumulative_fixed"] = df["fixed_amount"].cumsum()
 
+def zoom_slider(df, key):
+    # Long series are downsampled for the chart; narrowing the range here
+    # brings back the raw points of the selected period
+    if len(df) <= MAX_CHART_POINTS:
+        return df
+    first, last = df["last_updated"].iloc[0].date(), df["last_updated"].iloc[-1].date()
+    start, end = st.slider("🔍 Zeitraum zoomen", first, last, (first, last), format="DD.MM.YYYY", key=key)
+    return zoom(df, start, end)
+
+
+def chart_mode(df, plotted):
+    return "lines+markers" if len(plotted) == len(df) else "lines"
+
+
+
+def show_fund_chart(df, fund_name, key_suffix=""):
     # 📊 Rendite berechnen (Gewinn/Verlust gegenüber Einzahlungen)
-    invested_total = df["cumulative_fixed"].iloc[-1]
-    current_value = df["actual_value"].iloc[-1]
-    profit = current_value - invested_total
-    percent_return = (profit / invested_total) * 100 if invested_total > 0 else 0
+    returns = fund_returns(df)
+    profit, percent_return = returns["profit"], returns["percent"]
 
     st.metric("📊 Gewinn / Verlust", f"{profit:.2f} €", delta=f"{percent_return:.2f}%")
 
     # 📈 Diagramm anzeigen
+    df = zoom_slider(df, key=f"zoom_{fund_name}_{key_suffix}")
+    plotted = downsample(df, "last_updated", "actual_value")
+    mode = chart_mode(df, plotted)
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(
-        x=df['last_updated'],
-        y=df['actual_value'],
-        mode='lines+markers',
+        x=plotted['last_updated'],
+        y=plotted['actual_value'],
+        mode=mode,
         name='📈 Aktueller Wert'
     ))
 
     fig.add_trace(go.Scatter(
-        x=df['last_updated'],
-        y=df['cumulative_fixed'],
-        mode='lines+markers',
+        x=plotted['last_updated'],
+        y=plotted['cumulative_contribution'],
+        mode=mode,
         name='💶 Eingezahlter Gesamtbetrag'
     ))
 
@@ -67,6 +104,7 @@ def show_fund_chart(df, fund_name, key_suffix=""):
 
 
 
+@page_timer
 def fund_analysis(conn):
     st.subheader("📊 Fondsanalyse")
 
@@ -77,59 +115,43 @@ def fund_analysis(conn):
 
     selected_fund = st.selectbox("📌 Fonds auswählen", fund_names, key="fond_select")
     df = get_fund_history(conn, selected_fund)
-    df["last_updated"] = pd.to_datetime(df["last_updated"]).dt.date
-    today = pd.Timestamp.today().date() 
 
     if df.empty:
         st.warning("Keine Daten vorhanden.")
         return
 
-    # --- Tabs für Zeiträume ---
-    time_tabs = st.tabs(["🔁 Letzte 6 Monate", "🕛 Letzte 12 Monate", "📅 Letzte 24 Monate", "📖 Alle"])
-
-    ranges = {
-    "6": today - pd.DateOffset(months=6),
-    "12": today - pd.DateOffset(months=12),
-    "24": today - pd.DateOffset(months=24)
-    }
-
-    views = {
-    0: df[df["last_updated"] >= ranges["6"].date()],
-    1: df[df["last_updated"] >= ranges["12"].date()],
-    2: df[df["last_updated"] >= ranges["24"].date()],
-    3: df
-    }
-
-    for i, tab in enumerate(time_tabs):
-        with tab:
-            filtered_df = views[i]
-
-            if filtered_df.empty:
-                st.info("Keine Daten für diesen Zeitraum.")
-                continue
-
-            # Use a unique key suffix for each view
-            key_suffix = f"{i}_months"
-
-            # Pass key_suffix to ensure unique chart key
-            show_fund_chart(filtered_df, selected_fund, key_suffix=key_suffix)
-            show_growth(filtered_df)
-
-            csv = filtered_df.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                label="📥 CSV herunterladen",
-                data=csv,
-                file_name=f"{selected_fund}_funds_{key_suffix}.csv",
-                mime="text/csv",
-                key=f"download_{selected_fund}_{key_suffix}"  # 🔑 unique key
-            )
+    # --- Zeitraum: only the selected window is filtered and rendered ---
+    labels = list(FUND_WINDOWS)
+    selected_window = st.segmented_control("Zeitraum", labels, default=labels[0], key="fund_window")
+    selected_window = selected_window or labels[0]
+    months = FUND_WINDOWS[selected_window]
+
+    filtered_df = fund_window(df, months)
+    if filtered_df.empty:
+        st.info("Keine Daten für diesen Zeitraum.")
+        return
+
+    key_suffix = f"{months or 'all'}_months"
+    show_fund_chart(filtered_df, selected_fund, key_suffix=key_suffix)
+    show_growth(filtered_df)
+    show_performance(filtered_df)
+
+    lazy_download_button(
+        "📄 CSV erstellen", "📥 CSV herunterladen",
+        lambda: filtered_df.to_csv(index=False, date_format="%Y-%m-%d").encode("utf-8"),
+        file_name=f"{selected_fund}_funds_{key_suffix}.csv",
+        mime="text/csv",
+        key=f"download_{selected_fund}_{key_suffix}",  # 🔑 unique key
+        version=data_version(conn, "fund_history", "funds"),
+    )
 
 def reset_button(selected):
     st.session_state["delete_confirm"] = False
-    delete_fund(conn, selected)
+    delete_fund(get_connection(), selected)
     time.sleep(2)
     st.success(f"✅ Fonds '{selected}' wurde gelöscht.")
 
+@page_timer
 def fund_tracker(conn):
     st.title("💼 Fondsverwaltung & Analyse")
 
@@ -206,12 +228,13 @@ def fund_tracker(conn):
 
 
 # --- APP ENTRYPOINT ---
-conn = get_connection()
+if __name__ == "__main__":
+    conn = get_connection()
 
-# Optional: Nur einmal Dummy-Daten hinzufügen (z.B. in einem Button oder Setup-Skript)
-# #clear_fund_data(conn)
-# if "dummy_added" not in st.session_state:
-#     populate_dummy_fund_data(conn)
-#     st.session_state["dummy_added"] = True
+    # Optional: Nur einmal Dummy-Daten hinzufügen (z.B. in einem Button oder Setup-Skript)
+    # #clear_fund_data(conn)
+    # if "dummy_added" not in st.session_state:
+    #     populate_dummy_fund_data(conn)
+    #     st.session_state["dummy_added"] = True
 
-fund_tracker(conn)
\ No newline at end of file
+    fund_tracker(conn)
@@ -2,10 +2,57 @@ import time
 import streamlit as st
 import pandas as pd
 from db import *
+from instrumentation import page_timer
+from importer import import_statement
+from widgets import edited_rows, editor_key, keyset_pager, mark_saved
 from datetime import date
 
+CATEGORIES = ["Lebensmittel", "Utensilien", "Mobilität", "Freizeit", "Hund", "Wolle", "Familie", "Sonstiges"]
 
 
+@page_timer
+def expense_list(conn):
+    st.subheader("📋 Extraausgaben im letzten Monat")
+
+    today = date.today()
+    start = today - pd.DateOffset(months=1)
+    page = keyset_pager(
+        "expense_list",
+        lambda after, limit: get_expense_page(conn, after, limit, start=start, end=today),
+        lambda row: (row["date"], int(row["id"])),
+        EXPENSE_PAGE_SIZE,
+    )
+    if page.empty:
+        st.info("Keine Ausgaben erfasst.")
+        return
+
+    key = editor_key("expense_table", len(st.session_state["expense_list_cursors"]))
+    edited = st.data_editor(
+        page.assign(delete=False),
+        key=key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["id"],
+        column_order=["date", "description", "amount", "category", "delete"],
+        column_config={
+            "date": st.column_config.DateColumn("Datum", format="DD.MM.YYYY", required=True),
+            "description": "Beschreibung",
+            "amount": st.column_config.NumberColumn("Betrag (€)", min_value=0.0, format="%.2f €", required=True),
+            "category": st.column_config.SelectboxColumn("Kategorie", options=CATEGORIES, required=True),
+            "delete": st.column_config.CheckboxColumn("🗑️"),
+        },
+    )
+
+    changed = edited_rows(key, edited)
+    if not changed.empty and st.button(f"💾 Änderungen speichern ({len(changed)})", key="expense_save"):
+        update_expenses(conn, changed[~changed["delete"]])
+        delete_expenses(conn, changed.loc[changed["delete"], "id"])
+        mark_saved("expense_table")
+        st.success("Änderungen gespeichert.")
+        st.rerun()
+
+
+@page_timer
 def expenses_editor(conn):
     st.title("💸 Ausgabe hinzufügen")
 
@@ -14,10 +61,7 @@ def expenses_editor(conn):
         col1, col2 = st.columns(2)
         with col1:
             expense_date = st.date_input("Datum", value=date.today())
-            category = st.selectbox(
-                "Kategorie",
-                ["Lebensmittel", "Utensilien", "Mobilität", "Freizeit", "Hund", "Wolle", "Familie", "Sonstiges"]
-            )
+            category = st.selectbox("Kategorie", CATEGORIES)
         with col2:
             amount = st.number_input("Betrag (€)", min_value=0.0, step=0.01, format="%.2f", value=None)
             description = st.text_input("Beschreibung")
@@ -31,29 +75,59 @@ def expenses_editor(conn):
             else:
                 st.warning("Bitte einen Betrag hinzufügen.")
 
-    # --- Display today's expenses with delete buttons ---
+    # --- Bank statement import ---
+    with st.expander("📂 Kontoauszug importieren"):
+        uploaded = st.file_uploader("CSV- oder CAMT-Datei (XML)", type=["csv", "xml"])
+        col1, col2 = st.columns(2)
+        encoding = col1.selectbox("Zeichensatz", ["utf-8", "cp1252"])
+        debits_positive = col2.checkbox("Ausgaben stehen als positive Beträge im Auszug")
+        if uploaded is not None and st.button("📥 Importieren"):
+            with st.spinner("Kontoauszug wird importiert..."):
+                inserted, skipped = import_statement(
+                    conn, uploaded, debits_positive=debits_positive, encoding=encoding
+                )
+            st.success(f"{inserted} Ausgaben importiert, {skipped} bereits vorhanden.")
+
+    # --- Expenses of the last month, one page at a time ---
     st.markdown("---")
-    st.subheader("📋 Exraausgaben im letzten Monat")
+    expense_list(conn)
 
-    df = get_expenses(conn)
-    df["date"] = pd.to_datetime(df["date"])
-    today = pd.to_datetime(date.today())
-    df_today = df[df["date"].dt.date == today.date()]
 
-    if df_today.empty:
-        st.info("Keine Ausgaben erfasst.")
-    else:
-        for i, row in df_today.iterrows():
-            col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 3, 1])
-            col1.write(row["description"])
-            col2.write(f"{row['amount']:.2f} €")
-            col3.write(row["category"])
-            col4.write(f"📅 {row['date'].date().isoformat()}")
-            if col5.button("🗑️", key=f"delete_exp_{row['id']}"):
-                delete_expense(conn, row["id"])
-                st.success(f"'{row['description']}' gelöscht.")
-                st.rerun()
+@page_timer
+def expense_search(conn):
+    st.subheader("🔍 Ausgaben durchsuchen")
+    text = st.text_input("Suchbegriff", key="expense_search", placeholder="z.B. Tierarzt oder Hund")
+    if not text.strip():
+        return
+
+    total = count_expense_matches(conn, text)
+    if total == 0:
+        st.info("Keine Treffer.")
+        return
 
+    pages = (total - 1) // SEARCH_PAGE_SIZE + 1
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Seite (von {pages})", min_value=1, max_value=pages, value=1, step=1,
+                               key="expense_search_page")
+    results = search_expenses(conn, text, offset=(page - 1) * SEARCH_PAGE_SIZE)
 
-conn = get_connection()
-expenses_editor(conn)
\ No newline at end of file
+    st.caption(f"{total} Treffer")
+    st.dataframe(
+        results.drop(columns="id"),
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "date": st.column_config.DateColumn("Datum", format="DD.MM.YYYY"),
+            "description": "Beschreibung",
+            "category": "Kategorie",
+            "amount": st.column_config.NumberColumn("Betrag (€)", format="%.2f €"),
+        },
+    )
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    expenses_editor(conn)
+    st.markdown("---")
+    expense_search(conn)
@@ -0,0 +1,103 @@
+# projection.py
+# Monte Carlo projection of the funds and the monthly budget.
+#
+# Every fund's monthly returns are drawn from a normal distribution with the
+# mean and standard deviation of its historical period returns (see
+# analytics.period_returns); the budget's monthly balance likewise from the
+# recent monthly balances. All paths, months and funds are simulated as one
+# float32 array per chunk of paths, and only the percentile bands of the
+# totals are returned. Chunks can be spread over a process pool.
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics import fund_matrix, period_returns, periods_per_year
+
+DEFAULT_PATHS = 1000
+DEFAULT_MONTHS = 120
+CHUNK_PATHS = 1000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def fund_parameters(histories):
+    # Monthly mean and standard deviation of every fund's returns, its latest
+    # value and its current monthly contribution
+    names, values, contributions, days, counts = fund_matrix(histories)
+    if not names:
+        return pd.DataFrame(columns=["mean", "std", "value", "contribution"], index=pd.Index([], name="name"))
+
+    returns = period_returns(values, contributions)
+    per_month = periods_per_year(days) / 12  # entries per month, 1 for monthly updates
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(returns, axis=1) * per_month
+        std = np.nanstd(returns, axis=1, ddof=1) * np.sqrt(per_month)
+
+    rows, last = np.arange(len(names)), counts - 1
+    return pd.DataFrame({
+        "mean": np.nan_to_num(mean),
+        "std": np.nan_to_num(std),
+        "value": np.nan_to_num(values[rows, last]),
+        "contribution": np.nan_to_num(contributions[rows, last]),
+    }, index=pd.Index(names, name="name"))
+
+
+def _simulate(seed, paths, months, funds, budget):
+    # Totals of one chunk of paths as (months x paths) arrays. The layout is
+    # months-major so every month's step works on one contiguous block.
+    rng = np.random.default_rng(seed)
+    mean, std, value, contribution = (funds[column].to_numpy(dtype=np.float32) for column in funds)
+
+    growth = rng.standard_normal((months, paths, len(funds)), dtype=np.float32)
+    growth *= std
+    growth += 1 + mean
+    np.maximum(growth, 0, out=growth)  # a fund cannot lose more than its value
+
+    fund_totals = np.empty((months, paths), dtype=np.float32)
+    values = np.broadcast_to(value, (paths, len(funds))).copy()
+    for month in range(months):
+        values *= growth[month]
+        values += contribution
+        values.sum(axis=1, out=fund_totals[month])
+
+    savings = rng.standard_normal((months, paths), dtype=np.float32)
+    savings *= budget[1]
+    savings += budget[0]
+    np.cumsum(savings, axis=0, out=savings)
+    return fund_totals, savings
+
+
+def _bands(totals, percentiles, index):
+    return pd.DataFrame(np.percentile(totals, percentiles, axis=1).T, index=index, columns=list(percentiles))
+
+
+def project(funds, balances=None, months=DEFAULT_MONTHS, paths=DEFAULT_PATHS, percentiles=PERCENTILES,
+            seed=None, workers=None, chunk_paths=CHUNK_PATHS, start=None):
+    # Percentile bands (month x percentile) of the total fund value and of the
+    # savings accumulated from the monthly balances, keyed "funds"/"savings".
+    # funds comes from fund_parameters, balances is a series of past monthly
+    # balances. Every chunk has its own seed derived from seed, so the result
+    # is the same with or without workers.
+    if balances is not None and len(balances) > 1:
+        budget = (float(balances.mean()), float(balances.std()))
+    else:
+        budget = (0.0, 0.0)
+    funds = funds[["mean", "std", "value", "contribution"]]
+
+    sizes = [min(chunk_paths, paths - offset) for offset in range(0, paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(chunk_seed, size, months, funds, budget) for chunk_seed, size in zip(seeds, sizes)]
+    if workers and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_simulate, *zip(*jobs)))
+    else:
+        chunks = [_simulate(*job) for job in jobs]
+
+    start = pd.Timestamp(start or pd.Timestamp.today()).normalize().replace(day=1)
+    index = pd.date_range(start + pd.offsets.MonthBegin(1), periods=months, freq="MS")
+    return {
+        "funds": _bands(np.concatenate([chunk[0] for chunk in chunks], axis=1), percentiles, index),
+        "savings": _bands(np.concatenate([chunk[1] for chunk in chunks], axis=1), percentiles, index),
+    }
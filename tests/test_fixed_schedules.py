@@ -0,0 +1,74 @@
+import pandas as pd
+
+import db
+import finance
+
+
+def history(rows):
+    return pd.DataFrame(rows, columns=["name", "amount", "valid_from", "interval_months", "day"]).assign(
+        valid_from=lambda df: pd.to_datetime(df["valid_from"])
+    )
+
+
+def posting_dates(history, start, end):
+    postings = pd.concat(finance.iter_postings(history, start, end))
+    return postings["date"].dt.strftime("%Y-%m-%d").tolist()
+
+
+def test_amount_edit_keeps_due_months():
+    yearly = history([("Versicherung", 120.0, "2024-01-01", 12, 15)])
+    edited = history([
+        ("Versicherung", 120.0, "2024-01-01", 12, 15),
+        ("Versicherung", 130.0, "2024-10-01", 12, 15),
+    ])
+    expected = ["2024-01-15", "2025-01-15", "2026-01-15"]
+    assert posting_dates(yearly, "2024-01-01", "2026-12-31") == expected
+    assert posting_dates(edited, "2024-01-01", "2026-12-31") == expected
+
+
+def test_restart_after_end_starts_a_new_schedule():
+    restarted = history([
+        ("Abo", 10.0, "2024-01-01", 12, 1),
+        ("Abo", None, "2024-06-01", 12, 1),
+        ("Abo", 20.0, "2025-03-01", 12, 1),
+    ])
+    assert posting_dates(restarted, "2024-01-01", "2026-12-31") == ["2024-01-01", "2025-03-01", "2026-03-01"]
+
+
+def test_edit_through_the_list_keeps_due_months(tmp_path):
+    conn = db.connect(str(tmp_path / "expenses.db"))
+    db.init_db(conn)
+    db.upsert_fixed_cost(conn, "Versicherung", 120.0, "2024-01-01", interval_months=12, day=15)
+    db.set_fixed_costs(conn, db.get_fixed_costs(conn).assign(amount=130.0), valid_from="2024-10-01")
+
+    postings = db.get_fixed_cost_postings(conn, "2024-01-01", "2026-12-31")
+    assert postings["date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-15", "2025-01-15", "2026-01-15"]
+    assert postings["amount"].tolist() == [120.0, 130.0, 130.0]
+
+
+def test_unchanged_items_add_no_history_row(tmp_path):
+    conn = db.connect(str(tmp_path / "expenses.db"))
+    db.init_db(conn)
+    db.upsert_fixed_cost(conn, "Miete", 800.0, "2024-01-01")
+    current = db.get_fixed_costs(conn)
+
+    db.set_fixed_costs(conn, current, valid_from="2025-01-01")
+    assert len(db.get_fixed_cost_history(conn)) == 1
+
+    db.set_fixed_costs(conn, current.assign(amount=850.0), valid_from="2025-01-01")
+    assert db.get_fixed_cost_history(conn)["amount"].tolist() == [800.0, 850.0]
+
+
+def test_filling_the_posting_cache_keeps_other_read_caches(tmp_path):
+    path = str(tmp_path / "expenses.db")
+    writer, reader = db.connect(path), db.connect(path)
+    db.init_db(writer)
+    db.upsert_fixed_cost(writer, "Miete", 800.0, "2024-01-01")
+
+    version = reader.execute("PRAGMA data_version").fetchone()[0]
+    assert len(db.get_fixed_cost_postings(writer, "2024-01-01", "2024-12-31")) == 12
+    assert reader.execute("PRAGMA data_version").fetchone()[0] == version
+
+    db.upsert_fixed_cost(writer, "Miete", 900.0, "2024-07-01")
+    postings = db.get_fixed_cost_postings(reader, "2024-01-01", "2024-12-31")
+    assert postings["amount"].tolist() == [800.0] * 6 + [900.0] * 6
@@ -0,0 +1,38 @@
+import streamlit as st
+
+
+def keyset_pager(key, fetch, cursor_of, limit):
+    # Shows one page of fetch(after, limit) with back/next buttons. The
+    # cursors of the pages visited so far are kept in the session, so going
+    # back needs no OFFSET either.
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    page = fetch(cursors[-1], limit + 1)
+    while page.empty and len(cursors) > 1:  # the rows of this page are gone
+        cursors.pop()
+        page = fetch(cursors[-1], limit + 1)
+    has_next = len(page) > limit
+    page = page.iloc[:limit]
+    if len(cursors) == 1 and not has_next:
+        return page
+
+    col1, col2, col3 = st.columns([1, 3, 1])
+    col1.button("⬅️ Zurück", key=f"{key}_back", disabled=len(cursors) == 1, on_click=cursors.pop)
+    col2.caption(f"Seite {len(cursors)}")
+    col3.button("Weiter ➡️", key=f"{key}_next", disabled=not has_next, on_click=cursors.append,
+                args=(cursor_of(page.iloc[-1]) if has_next else None,))
+    return page
+
+
+def edited_rows(key, edited):
+    # Rows of a st.data_editor that were changed since its last save
+    positions = sorted(st.session_state[key]["edited_rows"])
+    return edited.iloc[positions]
+
+
+def editor_key(key, page):
+    # A new key per page and per save, so no edits carry over
+    return f"{key}_{page}_{st.session_state.get(f'{key}_saved', 0)}"
+
+
+def mark_saved(key):
+    st.session_state[f"{key}_saved"] = st.session_state.get(f"{key}_saved", 0) + 1